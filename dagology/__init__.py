@@ -3,3 +3,4 @@ from generators import *
 from utils import *
 from metrics import *
 from matrix import *
+from reachability import *
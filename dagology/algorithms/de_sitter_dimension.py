@@ -117,7 +117,8 @@ def de_sitter_param_estimate(chains, initial_guess=None, debug=False):
     Parameters
     ----------
 
-    chains - 3-tuple of numbers of k-chains for k=1,2,3
+    chains - 3-tuple of numbers of k-chains for k=1,2,3,
+             such as chain_spectrum(G, 3)
     initial_guess - guess of parameters (T, d, K) to seed optimiser
     debug - bool, print debugging statements
 
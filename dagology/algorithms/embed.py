@@ -7,24 +7,304 @@
 
 __author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
 
+import numbers
+
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
 import dagology as dag
 
-__all__ = ['minkowski_embed']
+__all__ = ['minkowski_embed',
+           'LandmarkEmbedding']
 
 
-def minkowski_embed(G, D, node_list=None):
+def minkowski_embed(G, D, node_list=None, dtype=float, landmarks=None,
+                    landmark_method='random', seed=None):
     """ Embed a DAG in Minkowski spacetime
 
     We are using naive matrix methods currently but could upgrade in future
 
+    G may be a NetworkX DiGraph or a CausalMatrix, whose rows are the nodes
+    in order so node_list is ignored.
+    dtype is the floating point type of the separations and the embedding.
+    Longest paths are kept in the smallest unsigned integer type that holds
+    them, and np.float32 halves the memory of the rest, see mds.
 
+    landmarks - if given, the number of landmark nodes, or a list of them.
+                Only the separations from each landmark to every node are
+                found, approximately, see approx_landmark_spacelike_rows,
+                the landmarks are embedded by Lorentzian MDS and the other
+                nodes are placed from their separations to them, see
+                landmark_mds. This takes O(k*N) memory and O(k*E) time for
+                k landmarks and E edges, rather than O(N^2) and O(N^3).
+                Spacelike separations are overestimated: for a 2D causal
+                set of 1500 elements with 50 landmarks they are 1.4 times
+                the exact ones on average and 7% are set to the largest
+                separation, falling to 1.2 times and 3% with 150
+                landmarks. See LandmarkEmbedding to add nodes later
+    landmark_method - how the landmarks are chosen when a number is given,
+                      'random' for a uniform sample or 'degree' for the
+                      nodes with the most edges
+    seed - random seed or generator for 'random', see check_random_state
     """
-    if not node_list:
-        node_list = list(G.nodes())
-    A = nx.adjacency_matrix(G, node_list).toarray()
+    if isinstance(G, dag.CausalMatrix):
+        node_list = list(range(G.N))
+        A = G
+    else:
+        if not node_list:
+            node_list = list(G.nodes())
+        A = nx.adjacency_matrix(G, node_list)
+    if landmarks is not None:
+        if isinstance(A, dag.CausalMatrix):
+            A = A.to_sparse()
+        A = sp.csr_matrix(A)
+        L = _landmark_indices(A, landmarks, node_list, landmark_method, seed)
+        X, _, _ = _landmark_embedding(A, L, D, dtype)
+        return X, node_list
     LP = dag.longest_path_matrix(A)
-    ds2 = dag.naive_spacelike_matrix(LP)
-    X = dag.mds(ds2, D, method='lorentzian')
+    ds2 = dag.naive_spacelike_matrix(LP, dtype=dtype)
+    X = dag.mds(ds2, D, method='lorentzian', dtype=dtype)
     return X, node_list
+
+def _landmark_indices(A, landmarks, node_list, method, seed):
+    """ Return the sorted indices in node_list of the landmark nodes"""
+    N = A.shape[0]
+    if not isinstance(landmarks, numbers.Integral):
+        index = dict((node, i) for i, node in enumerate(node_list))
+        return np.array(sorted(index[node] for node in landmarks), dtype=int)
+    assert 0 < landmarks <= N, 'ERROR - need between 1 and N landmarks'
+    if method == 'random':
+        rng = dag.check_random_state(seed)
+        chosen = rng.choice(N, landmarks, replace=False)
+    elif method == 'degree':
+        degree = np.diff(A.indptr) + np.bincount(A.indices, minlength=N)
+        # stable, so ties go to the earliest nodes
+        chosen = np.argsort(-degree, kind='mergesort')[:landmarks]
+    else:
+        assert False, 'ERROR - landmark_method must be random or degree'
+    return np.sort(chosen)
+
+def _landmark_embedding(A, L, D, dtype=float):
+    """ Embed the DAG with CSR adjacency matrix A from landmark rows L
+
+    Returns the coordinates, the landmark longest paths of
+    landmark_longest_paths and the projection of landmark_projection"""
+    paths = dag.landmark_longest_paths(A, L)
+    ds2 = dag.approx_landmark_spacelike_rows(A, L, dtype=dtype, paths=paths)
+    projection = dag.landmark_projection(ds2[:, L], D, method='lorentzian',
+                                         dtype=dtype)
+    return dag.triangulate(ds2, projection), paths, projection
+
+
+class LandmarkEmbedding(object):
+    """ Minkowski embedding of a growing DAG, placing new nodes from landmarks
+
+    The DAG is embedded as by minkowski_embed with landmarks, and the
+    longest paths from and to each landmark are kept. Nodes added to the
+    DAG later are placed by add_nodes from their separations to the
+    landmarks alone, at a cost proportional to the number of new nodes
+    rather than to N.
+
+    Parameters
+    ----------
+
+    G - NetworkX DiGraph (DAG)
+    D - dimension of the Minkowski space
+    landmarks - number of landmark nodes, or a list of them
+    node_list - order of the nodes, default to G.nodes()
+    landmark_method - 'random' or 'degree', see minkowski_embed
+    seed - random seed or generator for 'random'
+    dtype - floating point type of the coordinates
+    refresh - if given, the whole DAG is embedded again by add_nodes once
+              the nodes added since the last full embedding are more than
+              this fraction of the nodes it embedded
+
+    Attributes
+    ----------
+
+    X - NxD array of coordinates, rows in node_list order
+    node_list - list of the embedded nodes
+    index - dict from node to its row in X
+    landmarks - array of the rows of the landmark nodes
+    LP_from, LP_to - kxN longest paths from and to each landmark
+    dmax - spacelike separation of nodes with no common past or future, the
+           longest path from a landmark, including those to added nodes
+    n_added - number of nodes added since the last full embedding
+
+    Notes
+    -----
+
+    A new node gets its longest paths from the landmarks from those of its
+    parents, and to the landmarks from those of its children. Its spacelike
+    separation from a landmark is the shortest longest path between a
+    common past element and a common future element among the landmarks
+    and its own parents and children. It is then placed by the least
+    squares triangulation of landmark MDS, see triangulate.
+
+    Paths between existing nodes through the new ones are not followed, so
+    the embedding drifts if new nodes link existing nodes which were
+    unrelated. A refresh, or calling refresh, embeds everything again.
+    """
+
+    def __init__(self, G, D, landmarks, node_list=None,
+                 landmark_method='random', seed=None, dtype=float,
+                 refresh=None):
+        self.D = D
+        self.dtype = dtype
+        self.refresh_fraction = refresh
+        if node_list is None:
+            node_list = list(G.nodes())
+        A = nx.adjacency_matrix(G, node_list)
+        L = _landmark_indices(A, landmarks, node_list, landmark_method, seed)
+        self._embed(G, node_list, [node_list[i] for i in L])
+
+    @property
+    def X(self):
+        return self._X[:self.N]
+
+    @property
+    def LP_from(self):
+        return self._LP_from[:, :self.N]
+
+    @property
+    def LP_to(self):
+        return self._LP_to[:, :self.N]
+
+    def refresh(self, G):
+        """ Embed every node of G again, from the same landmarks"""
+        node_list = self.node_list + [node for node in G.nodes()
+                                      if node not in self.index]
+        self._embed(G, node_list,
+                    [self.node_list[i] for i in self.landmarks])
+
+    def _embed(self, G, node_list, landmark_nodes):
+        self.node_list = list(node_list)
+        self.index = dict((node, i) for i, node in enumerate(self.node_list))
+        self.N = len(self.node_list)
+        self.landmarks = np.array([self.index[node]
+                                   for node in landmark_nodes], dtype=int)
+        A = sp.csr_matrix(nx.adjacency_matrix(G, self.node_list))
+        X, paths, self.projection = _landmark_embedding(A, self.landmarks,
+                                                        self.D, self.dtype)
+        self._X = X
+        self._LP_from, self._LP_to = paths
+        self.dmax = int(np.max(self._LP_from)) if self._LP_from.size else 0
+        # longest paths between landmarks, which new nodes do not change
+        self._between = self._LP_from[:, self.landmarks]
+        self.n_added = 0
+        self.n_embedded = self.N
+
+    def add_nodes(self, G, nodes=None):
+        """ Place new nodes of G in the embedding and return their coordinates
+
+        G - the DAG with the new nodes and their edges added
+        nodes - the new nodes, default to every node of G not yet embedded
+
+        Returns an array of the coordinates of nodes, in order"""
+        if nodes is None:
+            nodes = [node for node in G.nodes() if node not in self.index]
+        nodes = list(nodes)
+        new = [node for node in nodes if node not in self.index]
+        if self.refresh_fraction is not None and \
+                self.n_added + len(new) > \
+                self.refresh_fraction * self.n_embedded:
+            self.refresh(G)
+            return self.X[[self.index[node] for node in nodes]]
+        # parents before children
+        new = list(nx.topological_sort(G.subgraph(new)))
+        self._reserve(len(new))
+        for node in new:
+            self.index[node] = self.N
+            self.node_list.append(node)
+            self.N += 1
+        rows = np.array([self.index[node] for node in new], dtype=int)
+        parents = [self._rows(G.predecessors(node)) for node in new]
+        children = [self._rows(G.successors(node)) for node in new]
+        for i, P in zip(rows, parents):
+            self._set_paths(self._LP_from, i, P)
+        for i, C in reversed(list(zip(rows, children))):
+            self._set_paths(self._LP_to, i, C)
+        ds2 = np.zeros((len(self.landmarks), len(new)), dtype=self.dtype)
+        for n, (i, P, C) in enumerate(zip(rows, parents, children)):
+            ds2[:, n] = self._separations(i, P, C)
+        self._X[rows] = dag.triangulate(ds2, self.projection)
+        self.n_added += len(new)
+        return self.X[[self.index[node] for node in nodes]]
+
+    def _rows(self, nodes):
+        return np.array([self.index[node] for node in nodes
+                         if node in self.index], dtype=int)
+
+    def _reserve(self, n):
+        """ Grow the arrays, doubling them, to hold n more nodes"""
+        needed = self.N + n
+        capacity = self._X.shape[0]
+        if needed <= capacity:
+            return
+        capacity = max(needed, 2 * capacity)
+        k = len(self.landmarks)
+        # new paths may be one longer for every node added
+        dtype = np.promote_types(self._LP_from.dtype,
+                                 np.min_scalar_type(self.dmax + capacity))
+        for name, shape, kind in [('_X', (capacity, self.D), self.dtype),
+                                  ('_LP_from', (k, capacity), dtype),
+                                  ('_LP_to', (k, capacity), dtype)]:
+            old = getattr(self, name)
+            grown = np.zeros(shape, dtype=kind)
+            if name == '_X':
+                grown[:self.N] = old[:self.N]
+            else:
+                grown[:, :self.N] = old[:, :self.N]
+            setattr(self, name, grown)
+
+    def _set_paths(self, paths, i, neighbours):
+        """ Longest paths between the landmarks and row i, through
+        neighbours, which are all parents or all children of i"""
+        if len(neighbours) == 0:
+            return
+        steps = paths[:, neighbours].astype(int)
+        reached = (steps > 0) | (self.landmarks[:, np.newaxis] == neighbours)
+        paths[:, i] = np.max(np.where(reached, steps + 1, 0), axis=1)
+        if paths is self._LP_from:
+            # new nodes can lengthen the longest path from a landmark
+            self.dmax = max(self.dmax, int(np.max(paths[:, i])))
+
+    def _separations(self, i, parents, children):
+        """ Square separations from each landmark to row i"""
+        to_i = self._LP_from[:, i]
+        from_i = self._LP_to[:, i]
+        ds = to_i.astype(self.dtype) + from_i
+        ds2 = ds * ds * -1
+        spacelike = np.flatnonzero((to_i == 0) & (from_i == 0))
+        if len(spacelike) == 0:
+            return ds2
+        before = np.flatnonzero(to_i)
+        after = np.flatnonzero(from_i)
+        # longest paths from candidate common past elements, the landmarks
+        # before i and its parents, to candidate common future elements, the
+        # landmarks after i and its children. Parent to child is unknown.
+        paths = np.zeros((len(before) + len(parents),
+                          len(after) + len(children))) + np.inf
+        paths[:len(before), :len(after)] = self._between[np.ix_(before,
+                                                                after)]
+        paths[:len(before), len(after):] = self._LP_from[np.ix_(before,
+                                                                children)]
+        paths[len(before):, :len(after)] = self._LP_to[np.ix_(after,
+                                                              parents)].T
+        distance = np.zeros(len(spacelike)) + np.inf
+        if paths.size:
+            # which candidates are before and after each spacelike landmark
+            past = np.concatenate((self._between[before][:, spacelike].T,
+                                   self._LP_to[spacelike][:, parents]),
+                                  axis=1) > 0
+            future = np.concatenate((self._between[spacelike][:, after],
+                                     self._LP_from[spacelike][:, children]),
+                                    axis=1) > 0
+            # one landmark at a time, so only paths itself is held
+            for s in range(len(spacelike)):
+                common = paths[past[s]][:, future[s]]
+                if common.size:
+                    distance[s] = np.min(common)
+        distance = np.minimum(distance, self.dmax)
+        ds2[spacelike] = distance * distance
+        return ds2
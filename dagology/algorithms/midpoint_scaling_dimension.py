@@ -32,9 +32,7 @@ def sub_interval_sizes(G, a, b, i):
     
     2-tuple of the number of nodes in the [a,i] interval and the [i,b] interval
     """
-    I_a = dag.interval(G, a, i)
-    I_b = dag.interval(G, i, b)
-    return (I_a.number_of_nodes(), I_b.number_of_nodes())
+    return tuple(dag.interval_sizes(G, [(a, i), (i, b)]))
 
 
 def mpsd(G):
@@ -58,14 +56,14 @@ def mpsd(G):
     # easy method - just check every item on the midpoint
     # hard method - start at the middle and check to see where value first drops
     # easy is implemented here for now
-    max_N_min = 0
-    max_intervals = None
-    for i, w in enumerate(LP):
-        intervals = sub_interval_sizes(I, u, v, w)
-        N_min = min(intervals)
-        if N_min > max_N_min:
-            max_N_min = N_min
-            max_intervals = intervals
+    # sizes of [u, w] and [w, v] for every w, from one closure of I
+    # or from the reachability index of G, as intervals are the same in both
+    pairs = [(u, w) for w in LP] + [(w, v) for w in LP]
+    index = dag.cached_reachability_index(G)
+    sizes = dag.interval_sizes(I if index is None else index, pairs)
+    sizes = sizes.reshape(2, len(LP))
+    N_min = np.min(sizes, axis=0)
+    max_intervals = tuple(sizes[:, np.argmax(N_min)])
 
     I_total = I.number_of_nodes()
     sub_I_total = sum(max_intervals) - 1.  # midpoint appears twice
@@ -25,29 +25,42 @@ def mmd(G, k=2, already_tc=False):
     Parameters
     ----------
 
-    G : Networkx DiGraph
+    G : Networkx DiGraph, scipy.sparse adjacency matrix, CausalMatrix or
+        ReachabilityIndex. Only the links are needed
     k : int
         Length of chains to count - default to 2
+
+    A reachability index cached on G is used for its transitive closure.
+    For k=2 the relations are counted by count_relations, which never
+    holds the whole closure.
     """
-    if G.number_of_edges() == 0:
+    N, n_edges = _size(G)
+    if n_edges == 0:
         return 0
 
-    if not already_tc:
-        G = nx.transitive_closure(G)
-    N = G.number_of_nodes()
     if k == 2:
-        # this is a special case where we can use the inbuilt
-        # number_of_edges function
-        S = G.number_of_edges()
-        f_D = float(S) / (N ** 2.0)
+        # already_tc is the special case of counting the edges
+        S = dag.count_relations(G, already_tc)
     else:
-        S = dag.count_chains(G, k)
-        f_D = float(S) / (N ** k)
+        # count_chains closes G with bitsets, or uses a cached
+        # reachability index, which is faster than nx.transitive_closure
+        S = dag.count_chains(G, k, already_tc)
+    f_D = float(S) / (N ** k)
         
     # lookup inverse of f_D(k) to find D estimate
     D = mmd_lookup(f_D, k)
     return D
 
+def _size(G):
+    """ Number of nodes and of edges of a graph or adjacency matrix"""
+    if isinstance(G, dag.ReachabilityIndex):
+        G = G.closure
+    if isinstance(G, dag.CausalMatrix):
+        return G.N, G.number_of_relations()
+    if hasattr(G, 'tocsr'):
+        return G.shape[0], G.tocsr().count_nonzero()
+    return G.number_of_nodes(), G.number_of_edges()
+
 def mmd_estimate(S, k, N):
     """ Estimate Myrheim-Meyer dimension from given number of k-chains
     
@@ -51,3 +51,102 @@ class TestEmbed(object):
             for j in range(2):
                 assert_equal(X_2[i,j], X_5[i,j])
         
+
+    def test_causal_matrix(self):
+        G = nx.path_graph(5, create_using=nx.DiGraph())
+        X, nodes = dag.minkowski_embed(G, 2)
+        X_C, nodes_C = dag.minkowski_embed(dag.CausalMatrix.from_graph(G), 2)
+        assert_equal(nodes_C, list(range(5)))
+        assert_true(np.allclose(np.abs(X), np.abs(X_C)))
+
+    def test_all_landmarks(self):
+        G = dag.cube_space_graph(30, 2, seed=3)
+        X, nodes = dag.minkowski_embed(G, 2)
+        X_L, nodes_L = dag.minkowski_embed(G, 2, landmarks=30)
+        assert_equal(nodes, nodes_L)
+        assert_true(np.allclose(np.abs(X), np.abs(X_L)))
+
+class TestLandmarkEmbed(object):
+    """ Unit tests for embedding from landmarks"""
+
+    def setup(self):
+        self.G = dag.cube_space_graph(100, 2, seed=5)
+
+    def test_shape(self):
+        for method in ['random', 'degree']:
+            X, nodes = dag.minkowski_embed(self.G, 3, landmarks=20,
+                                           landmark_method=method, seed=1)
+            assert_equal(X.shape, (100, 3))
+            assert_true(np.all(np.isfinite(X)))
+
+    def test_seed(self):
+        X, _ = dag.minkowski_embed(self.G, 2, landmarks=15, seed=2)
+        Y, _ = dag.minkowski_embed(self.G, 2, landmarks=15, seed=2)
+        assert_true(np.array_equal(X, Y))
+
+    def test_landmark_list(self):
+        landmarks = [5, 17, 2, 60, 33, 80, 91, 44]
+        X, nodes = dag.minkowski_embed(self.G, 2, landmarks=landmarks)
+        # landmarks sit at the MDS embedding of their own separations
+        A = nx.adjacency_matrix(self.G, nodes)
+        L = sorted(nodes.index(node) for node in landmarks)
+        ds2 = dag.approx_landmark_spacelike_rows(A, L)
+        X_L = dag.mds(ds2[:, L], 2, method='lorentzian')
+        assert_true(np.allclose(X[L], X_L))
+
+    def test_bad_method(self):
+        assert_raises(AssertionError, dag.minkowski_embed, self.G, 2,
+                      landmarks=5, landmark_method='closest')
+
+class TestLandmarkEmbedding(object):
+    """ Unit tests for adding nodes to a landmark embedding"""
+
+    def setup(self):
+        self.G = dag.cube_space_graph(120, 2, hasse=True, seed=6)
+        # the last nodes in topological order only link to later ones
+        order = list(nx.topological_sort(self.G))
+        self.old, self.new = order[:100], order[100:]
+        self.landmarks = self.old[::10]
+
+    def test_add_nodes(self):
+        embedding = dag.LandmarkEmbedding(self.G.subgraph(self.old), 2,
+                                          self.landmarks, node_list=self.old)
+        X_old = embedding.X.copy()
+        X_new = embedding.add_nodes(self.G, self.new[::-1])
+        assert_equal(X_new.shape, (20, 2))
+        assert_true(np.all(np.isfinite(X_new)))
+        assert_equal(embedding.node_list[:100], self.old)
+        assert_equal(embedding.n_added, 20)
+        assert_true(np.array_equal(embedding.X[:100], X_old))
+        rows = [embedding.index[node] for node in self.new[::-1]]
+        assert_true(np.array_equal(embedding.X[rows], X_new))
+        # longest paths to the landmarks are those of the whole DAG
+        A = nx.adjacency_matrix(self.G, embedding.node_list)
+        LP_from, LP_to = dag.landmark_longest_paths(A, embedding.landmarks)
+        assert_true(np.array_equal(embedding.LP_from, LP_from))
+        assert_true(np.array_equal(embedding.LP_to, LP_to))
+        assert_equal(embedding.dmax, np.max(LP_from))
+        # nothing more to add
+        assert_equal(embedding.add_nodes(self.G).shape, (0, 2))
+
+    def test_batches(self):
+        embedding = dag.LandmarkEmbedding(self.G.subgraph(self.old), 3,
+                                          self.landmarks, node_list=self.old)
+        for start in range(0, 20, 3):
+            embedding.add_nodes(self.G, self.new[start:start + 3])
+        assert_equal(embedding.X.shape, (120, 3))
+        A = nx.adjacency_matrix(self.G, embedding.node_list)
+        LP_from, _ = dag.landmark_longest_paths(A, embedding.landmarks)
+        assert_true(np.array_equal(embedding.LP_from, LP_from))
+
+    def test_refresh(self):
+        embedding = dag.LandmarkEmbedding(self.G.subgraph(self.old), 2,
+                                          self.landmarks, node_list=self.old,
+                                          refresh=0.1)
+        embedding.add_nodes(self.G, self.new[:5])
+        assert_equal(embedding.n_added, 5)
+        embedding.add_nodes(self.G, self.new[5:])
+        assert_equal(embedding.n_added, 0)
+        fresh = dag.LandmarkEmbedding(self.G, 2, self.landmarks,
+                                      node_list=embedding.node_list)
+        assert_true(np.allclose(embedding.X, fresh.X))
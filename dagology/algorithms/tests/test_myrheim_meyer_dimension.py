@@ -27,6 +27,15 @@ class TestMMD(object):
         G.add_nodes_from([1, 2, 3])
         assert_equal(dag.mmd(G), 0)
 
+    def test_inputs(self):
+        G = dag.cube_space_graph(200, 2, hasse=True, seed=1)
+        D = dag.mmd(G)
+        closed = nx.transitive_closure(G)
+        assert_equal(dag.mmd(closed, already_tc=True), D)
+        assert_equal(dag.mmd(nx.adjacency_matrix(G)), D)
+        assert_equal(dag.mmd(dag.CausalMatrix.from_graph(G)), D)
+        assert_equal(dag.mmd(G, 3), dag.mmd(nx.adjacency_matrix(G), 3))
+
 
 class TestMMDFormula(object):
     """ Unit tests for the MMD formula"""
@@ -1,3 +1,4 @@
 from causal_set import *
 from cube_space import *
 from random_dag import *
+from ensemble import *
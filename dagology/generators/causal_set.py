@@ -6,6 +6,10 @@ Available methods:
 minkowski_interval(N, D)
 de_sitter_interval(N, D, eta_0, eta_1)
 causal_set_graph(R, p)
+causal_set_relation(R, p)
+causal_set_links(R, p)
+causal_set_edge_blocks(R, p)
+save_causal_set(path, R, p)
 """
 
 #    Copyright (C) 2016 by
@@ -15,17 +19,31 @@ causal_set_graph(R, p)
 
 __author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
 
+import os
+
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
 
 import dagology as dag
 
 __all__ = ['causal_set_graph',
+           'causal_set_relation',
+           'causal_set_links',
+           'causal_set_edge_blocks',
+           'save_causal_set',
+           'load_causal_set_blocks',
+           'load_causal_set',
            'minkowski_interval',
            'de_sitter_interval']
 
+# number of grid intervals in time and radius for de Sitter map tables
+DE_SITTER_MAP_GRID = (1024, 256)
+DE_SITTER_MAP_TABLES = {}
+
 
-def causal_set_graph(R, p=1.0, periodic=None):
+def causal_set_graph(R, p=1.0, periodic=None, block_size=None,
+                     method='block', seed=None, hasse=False):
     """
     Create a Causal Set DAG from a set of coordinates, an NxD numpy array
 
@@ -35,7 +53,14 @@ def causal_set_graph(R, p=1.0, periodic=None):
 
     R - coordinates of points
     p - probability with which allowed edges appear
-    periodic - list - the periodic size of each dimension
+    periodic - list - the periodic size of each spatial dimension
+    block_size - number of rows of the causal relation computed at once
+    method - 'block' or 'index', see causal_set_relation
+    seed - random seed or generator used for thinning, see check_random_state
+    hasse - if True, only include the links (the transitive reduction),
+            found directly from the coordinates by causal_set_links.
+            Thinning the links would not give the reduction of the thinned
+            relation, so p must be 1
 
     Notes
     -----
@@ -43,26 +68,395 @@ def causal_set_graph(R, p=1.0, periodic=None):
     We are assuming a conformal spacetime - ie. lightcones are straight lines
     and therefore can calculate whether two points should be connected using
     the Minkowski metric.
+
+    The relation is built by causal_set_relation before any networkx objects
+    are created.
     """
-    G = nx.DiGraph()
+    if hasse:
+        if p < 1:
+            assert False, 'ERROR - hasse=True is only valid with p=1'
+        A = causal_set_links(R, p, periodic, block_size, seed)
+    else:
+        A = causal_set_relation(R, p, periodic, block_size, method, seed)
     N, D = R.shape
-    edgelist = []
-    for i in range(N):
-        G.add_node(i, position=tuple(R[i]))
-        for j in range(N):
-            if R[i, 0] < R[j, 0]:
-                if p == 1. or p > np.random.random():
-                    if periodic:
-                        if dag.minkowski_periodic(R[i], R[j], periodic) < 0:
-                            edgelist.append([i,j])
-                    else:
-                        if dag.minkowski(R[i], R[j]) < 0:
-                            edgelist.append([i,j])
-    G.add_edges_from(edgelist)
+    G = nx.DiGraph()
+    G.add_nodes_from((i, {'position': tuple(R[i])}) for i in range(N))
+    G.add_edges_from(zip(*A.nonzero()))
     return G
 
 
-def minkowski_interval_scatter(N, D, fix_ends=True):
+def causal_set_relation(R, p=1.0, periodic=None, block_size=None,
+                        method='block', seed=None):
+    """
+    Return the causal relation of a set of coordinates as a sparse matrix
+
+    Parameters
+    ----------
+
+    R - coordinates of points, an NxD numpy array
+    p - probability with which allowed edges appear
+    periodic - list - the periodic size of each spatial dimension, or a number
+               for all of them, see minkowski_periodic_cdist
+    block_size - number of rows of the relation computed at once
+                 (default chosen so each block uses about BLOCK_MEMORY bytes)
+    method - 'block' tests every pair of points, a block of rows at a time
+             'index' only tests pairs in neighbouring cells of a spatial grid
+    seed - random seed or generator used for thinning, see check_random_state
+
+    Returns
+    -------
+
+    A - NxN scipy.sparse CSR boolean matrix, A[i,j] is True iff there is an
+        edge from i to j, ie. i is in the causal past of j
+
+    Notes
+    -----
+
+    Separations are computed with numpy broadcasting for blocks of rows at a
+    time, so memory use is bounded by the block size rather than N^2.
+    Bernoulli thinning with probability p is applied to each block.
+
+    The index method buckets space into cells at least as wide as the height
+    of the region, so the future lightcone of a point can only reach its own
+    and adjacent cells. Candidates in those cells are kept in time order and
+    only those later than the point are tested. For regions much wider than
+    they are tall this scales with the number of relations rather than N^2.
+    """
+    N, D = R.shape
+    rng = dag.check_random_state(seed)
+    if method == 'index':
+        return _indexed_relation(R, p, periodic, block_size, rng)
+    elif method != 'block':
+        assert False, 'Invalid method %s given to causal_set_relation' % method
+    blocks = [A for start, stop, A in
+              causal_set_edge_blocks(R, p, periodic, block_size, rng)]
+    if not blocks:
+        return sp.csr_matrix((N, N), dtype=bool)
+    return sp.vstack(blocks, format='csr')
+
+
+def causal_set_links(R, p=1.0, periodic=None, block_size=None, seed=None):
+    """
+    Return the links of the causal set of a set of coordinates
+
+    Parameters
+    ----------
+
+    R - coordinates of points, an NxD numpy array
+    p - probability with which each link appears, so for p < 1 a random
+        subset of the links rather than the links of a thinned relation
+    periodic - list - the periodic size of each spatial dimension
+    block_size - number of points whose futures are computed at once
+    seed - random seed or generator used for thinning, see check_random_state
+
+    Returns
+    -------
+
+    L - NxN scipy.sparse CSR boolean matrix, L[i,j] is True iff i precedes j
+        and no other point lies in the interval between them
+
+    Notes
+    -----
+
+    Points are sorted by time, and the future of each point is found a block
+    of points at a time. Within the future of i the earliest remaining point
+    is always a link, as anything between them would be earlier still, and
+    every point in its future is then discarded. Repeating this until no
+    candidates are left finds all the links of i, so only the links are
+    stored and memory scales with their number rather than the relation.
+    """
+    N, D = R.shape
+    rng = dag.check_random_state(seed)
+    order = np.argsort(R[:, 0], kind='mergesort')
+    R = R[order]
+    if block_size is None:
+        block_size = _block_rows(N)
+    rows, cols = [], []
+    for start in range(0, N, block_size):
+        stop = min(start + block_size, N)
+        # points can only precede those later in time order
+        future = _relation_mask(R[start:stop], R[start + 1:], periodic)
+        for i in range(start, stop):
+            candidates = np.flatnonzero(future[i - start]) + start + 1
+            while len(candidates) > 0:
+                j = candidates[0]
+                rows.append(i)
+                cols.append(j)
+                candidates = candidates[1:]
+                later = _relation_mask(R[j:j + 1], R[candidates], periodic)
+                candidates = candidates[~later[0]]
+    rows, cols = _thin(np.array(rows, dtype=int), np.array(cols, dtype=int),
+                       p, rng)
+    data = np.ones(len(rows), dtype=bool)
+    L = sp.csr_matrix((data, (order[rows], order[cols])), shape=(N, N))
+    L.sort_indices()
+    return L
+
+
+def causal_set_edge_blocks(R, p=1.0, periodic=None, block_size=None,
+                           seed=None):
+    """
+    Generate the causal relation of a set of coordinates a block at a time
+
+    Parameters
+    ----------
+
+    R - coordinates of points, an NxD numpy array
+    p - probability with which allowed edges appear
+    periodic - list - the periodic size of each spatial dimension
+    block_size - number of rows of the relation in each block
+    seed - random seed or generator used for thinning, see check_random_state
+
+    Yields
+    ------
+
+    (start, stop, A) - A is a (stop-start)xN scipy.sparse CSR boolean matrix
+                       holding rows start:stop of the causal relation
+
+    Notes
+    -----
+
+    Only one block is held in memory at a time, so relations too large to
+    store can be streamed to later stages or to disk, see save_causal_set.
+    """
+    N, D = R.shape
+    rng = dag.check_random_state(seed)
+    if block_size is None:
+        block_size = _block_rows(N)
+    for start in range(0, N, block_size):
+        stop = min(start + block_size, N)
+        yield start, stop, _relation_block(R, start, stop, p, periodic, rng)
+
+
+def save_causal_set(path, R, p=1.0, periodic=None, block_size=None,
+                    seed=None):
+    """
+    Write the coordinates and causal relation of a causal set to disk
+
+    Parameters
+    ----------
+
+    path - directory to write to, created if it does not exist
+    R - coordinates of points, an NxD numpy array
+    p, periodic, block_size, seed - as for causal_set_edge_blocks
+
+    Notes
+    -----
+
+    The directory holds the relation in CSR form as .npy files
+        coordinates.npy - the NxD coordinates R
+        indptr.npy - CSR row pointers for the whole relation, int64
+        blocks.npy - first row of each block, and N
+        indices_XXXXX.npy - CSR column indices of the rows in each block,
+                            int32 unless N or the block is too large
+    Blocks are written as they are generated, so the relation is never held
+    in memory in full. Read it back with load_causal_set_blocks.
+    """
+    N, D = R.shape
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    np.save(os.path.join(path, 'coordinates.npy'), R)
+    indptr = np.zeros(N + 1, dtype=np.int64)
+    starts = []
+    for b, (start, stop, A) in enumerate(
+            causal_set_edge_blocks(R, p, periodic, block_size, seed)):
+        # the block's own row pointers are rebuilt with this dtype on load
+        index_dtype = np.int32 if max(N, A.nnz) < 2**31 else np.int64
+        np.save(os.path.join(path, 'indices_%05d.npy' % b),
+                A.indices.astype(index_dtype, copy=False))
+        indptr[start + 1:stop + 1] = indptr[start] + A.indptr[1:]
+        starts.append(start)
+    np.save(os.path.join(path, 'indptr.npy'), indptr)
+    np.save(os.path.join(path, 'blocks.npy'), np.array(starts + [N]))
+
+
+def load_causal_set_blocks(path, mmap_mode='r'):
+    """
+    Read the causal relation written by save_causal_set a block at a time
+
+    Parameters
+    ----------
+
+    path - directory written by save_causal_set
+    mmap_mode - passed to numpy.load, 'r' maps the files rather than
+                reading them into memory
+
+    Yields
+    ------
+
+    (start, stop, A) - as for causal_set_edge_blocks
+    """
+    indptr = np.load(os.path.join(path, 'indptr.npy'), mmap_mode=mmap_mode)
+    starts = np.load(os.path.join(path, 'blocks.npy'))
+    N = len(indptr) - 1
+    for b in range(len(starts) - 1):
+        start, stop = starts[b], starts[b + 1]
+        indices = np.load(os.path.join(path, 'indices_%05d.npy' % b),
+                          mmap_mode=mmap_mode)
+        # match the dtype of the indices so scipy does not copy them
+        block_indptr = (np.asarray(indptr[start:stop + 1]) -
+                        indptr[start]).astype(indices.dtype)
+        data = np.ones(len(indices), dtype=bool)
+        A = sp.csr_matrix((data, indices, block_indptr),
+                          shape=(stop - start, N), copy=False)
+        yield start, stop, A
+
+
+def load_causal_set(path):
+    """
+    Read the coordinates and causal relation written by save_causal_set
+
+    Returns
+    -------
+
+    R - NxD numpy array of coordinates
+    A - NxN scipy.sparse CSR boolean matrix of the causal relation
+    """
+    R = np.load(os.path.join(path, 'coordinates.npy'))
+    blocks = [A for start, stop, A in load_causal_set_blocks(path, None)]
+    if not blocks:
+        N = R.shape[0]
+        return R, sp.csr_matrix((N, N), dtype=bool)
+    return R, sp.vstack(blocks, format='csr')
+
+
+def _block_rows(N):
+    """ Number of rows of an N column float64 array fitting in BLOCK_MEMORY
+
+    A few temporaries of this size are alive at once while a block is built"""
+    return int(max(1, dag.utils.BLOCK_MEMORY // (8 * 4 * max(N, 1))))
+
+
+def _relation_mask(X, Y, periodic=None):
+    """ Return boolean array, True where X[i] is in the causal past of Y[j]
+
+    Separations are found in the precision of the coordinates, at least
+    single precision"""
+    dtype = np.promote_types(np.result_type(X, Y), np.float32)
+    dt = Y[np.newaxis, :, 0] - X[:, 0, np.newaxis]
+    if periodic:
+        ds2 = dag.minkowski_periodic_cdist(X, Y, periodic, dtype=dtype)
+    else:
+        ds2 = dag.minkowski_cdist(X, Y, dtype=dtype)
+    # edges only go forwards in time, and must be timelike separated
+    return (dt > 0.) & (ds2 < 0.)
+
+
+def _thin(rows, cols, p, rng):
+    """ Keep each of the given edges independently with probability p"""
+    if p == 1.:
+        return rows, cols
+    keep = rng.uniform(size=len(rows)) < p
+    return rows[keep], cols[keep]
+
+
+def _relation_block(R, start, stop, p, periodic, rng):
+    """ Return rows start:stop of the causal relation of R as a CSR matrix"""
+    related = _relation_mask(R[start:stop], R, periodic)
+    if p != 1.:
+        rows, cols = np.nonzero(related)
+        rows, cols = _thin(rows, cols, p, rng)
+        related = np.zeros(related.shape, dtype=bool)
+        related[rows, cols] = True
+    return sp.csr_matrix(related)
+
+
+def _grid_cells(R, periodic=None):
+    """ Assign each point of R to a cell of a spatial grid
+
+    Cells are at least as wide as the height of the region in time so
+    related points always lie in the same or adjacent cells.
+
+    Returns
+    -------
+
+    C - NxD-1 integer array of cell coordinates
+    n_cells - list, number of cells in each spatial dimension, or None if
+              that dimension is not periodic
+    """
+    N, D = R.shape
+    height = np.max(R[:, 0]) - np.min(R[:, 0])
+    C = np.zeros((N, D - 1), dtype=np.int64)
+    n_cells = []
+    period = dag.spatial_periods(periodic, D)
+    for d in range(1, D):
+        period_d = period[d - 1]
+        if period_d:
+            n = max(1, int(np.floor(period_d / height))) if height > 0 else 1
+            x = np.mod(R[:, d], period_d)
+            C[:, d - 1] = np.minimum((x * n / period_d).astype(np.int64), n - 1)
+            n_cells.append(n)
+        else:
+            x = R[:, d] - np.min(R[:, d])
+            if height > 0:
+                C[:, d - 1] = np.floor(x / height).astype(np.int64)
+            n_cells.append(None)
+    return C, n_cells
+
+
+def _neighbour_cells(cell, n_cells):
+    """ Return the set of cells adjacent to cell, including itself"""
+    neighbours = [()]
+    for c, n in zip(cell, n_cells):
+        if n is None:
+            options = (c - 1, c, c + 1)
+        else:
+            options = set([(c - 1) % n, c, (c + 1) % n])
+        neighbours = [x + (o,) for x in neighbours for o in options]
+    return neighbours
+
+
+def _indexed_relation(R, p, periodic, block_size, rng):
+    """ Causal relation of R testing only pairs in neighbouring grid cells"""
+    N, D = R.shape
+    if N == 0 or D == 1:
+        return causal_set_relation(R, p, periodic, block_size, seed=rng)
+    C, n_cells = _grid_cells(R, periodic)
+    # sort by cell, and by time within each cell
+    order = np.lexsort([R[:, 0]] + [C[:, d] for d in range(D - 2, -1, -1)])
+    C_sorted = C[order]
+    new_cell = np.ones(N, dtype=bool)
+    new_cell[1:] = np.any(C_sorted[1:] != C_sorted[:-1], axis=1)
+    starts = np.flatnonzero(new_cell)
+    stops = np.append(starts[1:], N)
+    cells = dict((tuple(C_sorted[a]), (a, b)) for a, b in zip(starts, stops))
+    t_sorted = R[order, 0]
+
+    rows, cols = [], []
+    for cell, (a, b) in cells.items():
+        t_min = t_sorted[a]
+        candidates = []
+        for other in _neighbour_cells(cell, n_cells):
+            if other not in cells:
+                continue
+            a_, b_ = cells[other]
+            # only points later than the earliest point in this cell
+            a_ += np.searchsorted(t_sorted[a_:b_], t_min, side='right')
+            candidates.append(order[a_:b_])
+        if not candidates:
+            continue
+        candidates = np.concatenate(candidates)
+        if len(candidates) == 0:
+            continue
+        Y = R[candidates]
+        chunk = block_size or _block_rows(len(candidates))
+        for start in range(a, b, chunk):
+            points = order[start:min(start + chunk, b)]
+            i, j = np.nonzero(_relation_mask(R[points], Y, periodic))
+            rows.append(points[i])
+            cols.append(candidates[j])
+    if rows:
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+    else:
+        rows, cols = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    rows, cols = _thin(rows, cols, p, rng)
+    data = np.ones(len(rows), dtype=bool)
+    A = sp.csr_matrix((data, (rows, cols)), shape=(N, N))
+    A.sort_indices()
+    return A
+
+
+def minkowski_interval_scatter(N, D, fix_ends=True, seed=None):
     """ Scatter N points in a D dimensional interval in Minkowski space
 
     Parameters
@@ -71,6 +465,7 @@ def minkowski_interval_scatter(N, D, fix_ends=True):
     N - number of points
     D - dimension of spacetime
     fix_ends - if True, have points at start and end of interval
+    seed - random seed or generator, see check_random_state
 
     Notes
     -----
@@ -78,34 +473,150 @@ def minkowski_interval_scatter(N, D, fix_ends=True):
     Throw points into a unit box rejecting those outside the interval
     Repeat until N points have been reached
     Note that this is inefficient for large D"""
-    R = np.random.random((N, D))
     a = np.zeros(D)
     a[1:] = 0.5
     b = np.zeros(D)
     b[0] = 1.
     b[1:] = 0.5
+    rng = dag.check_random_state(seed)
+    i_start = 2 if fix_ends else 0
+    R = np.empty((N, D))
+    R[i_start:] = rejection_sample(N - i_start,
+                                   lambda n: rng.uniform(size=(n, D)),
+                                   _in_minkowski_interval,
+                                   minkowski_interval_volume(D))
     if fix_ends:
         R[0] = a
         R[1] = b
-        i_start = 2
-    else:
-        i_start = 0
-    for i in range(i_start, N):
-        while (dag.minkowski(a, R[i, :]) > 0) or ((dag.minkowski(R[i, :], b) > 0)):
-            R[i, :] = np.random.random(D)
     return R
 
 
-def minkowski_interval_map(N, D, fix_ends=True):
+def minkowski_interval_volume(D):
+    """ Volume of the D dimensional interval between (0, 0.5, ...) and
+    (1, 0.5, ...), which is the fraction of the unit cube that it fills"""
+    d = D - 1
+    ball_volume = 1. if d == 0 else dag.sphere_volume(d - 1)
+    return 2. * ball_volume * 0.5**(d + 1) / (d + 1)
+
+
+def _in_minkowski_interval(R):
+    """ Return boolean array, True for rows of R in the unit interval"""
+    x2 = np.sum((R[:, 1:] - 0.5)**2, axis=1)
+    return (x2 <= R[:, 0]**2) & (x2 <= (1. - R[:, 0])**2)
+
+
+def rejection_sample(N, propose, accept, acceptance_rate=1.):
+    """ Generate N samples by batched rejection sampling
+
+    Parameters
+    ----------
+
+    N - number of samples required
+    propose - function, propose(n) returns an array of n candidate rows
+    accept - function, accept(X) returns a boolean array marking the rows
+             of X to keep
+    acceptance_rate - expected fraction of candidates which are accepted
+
+    Notes
+    -----
+
+    Candidates are proposed and tested as whole arrays. Each batch is
+    oversampled using the acceptance rate, which is re-estimated from the
+    candidates seen so far, and further batches top up any shortfall.
+    """
+    samples = []
+    n_found = 0
+    n_proposed = 0
+    n_accepted = 0
+    while n_found < N:
+        n_needed = N - n_found
+        n_draw = int(np.ceil(1.1 * n_needed / acceptance_rate)) + 16
+        n_draw = min(n_draw, max(n_needed, dag.utils.BLOCK_MEMORY // 64))
+        X = propose(n_draw)
+        X = X[accept(X)]
+        samples.append(X[:n_needed])
+        n_found += min(len(X), n_needed)
+        n_proposed += n_draw
+        n_accepted += len(X)
+        if n_accepted > 0:
+            acceptance_rate = float(n_accepted) / n_proposed
+    if not samples:
+        return propose(0)
+    return np.concatenate(samples, axis=0)
+
+
+def minkowski_interval_map(N, D, fix_ends=True, seed=None):
     """ Scatter N points in a D dimensional interval in Minkowski space
 
     Build Minkowski interval in `clever' way by mapping [0,1]^D to
     the correct spacetime coords
+
+    Parameters
+    ----------
+
+    N - number of points
+    D - dimension of spacetime
+    fix_ends - if True, have points at start and end of interval
+    seed - random seed or generator, see check_random_state
+
+    Notes
+    -----
+
+    The interval has its tips at t=0 and t=1, and at time t the spatial
+    slice is a ball of radius r(t) = min(t, 1-t), centred on 0.5.
+    The volume at time t is proportional to r(t)^(D-1), so the time of each
+    point is found by inverting the cumulative distribution
+        F(t) = (2t)^D / 2              for t < 1/2
+        F(t) = 1 - (2(1-t))^D / 2      for t > 1/2
+    and then its spatial position is sampled uniformly within the ball.
+    No points are rejected so all N are generated in a single pass.
     """
-    assert False, 'ERROR - minkowski_interval_map not implemented yet'
+    rng = dag.check_random_state(seed)
+    d = D - 1
+    T = _interval_time(rng.uniform(size=N), D)
+    R = np.empty((N, D))
+    R[:, 0] = T
+    if d > 0:
+        # uniform in a unit ball, scaled to the radius of the slice
+        radius = np.minimum(T, 1. - T) * rng.uniform(size=N)**(1. / d)
+        R[:, 1:] = 0.5 + _ball_directions(N, d, rng) * radius.reshape(N, 1)
+    if fix_ends:
+        R[0] = 0.5
+        R[0, 0] = 0.
+        R[1] = 0.5
+        R[1, 0] = 1.
+    return R
+
+
+def _interval_time(U, D):
+    """ Map uniform U in [0,1] to times distributed as the volume of a
+    D dimensional interval between t=0 and t=1"""
+    T = np.empty(U.shape)
+    lower = U < 0.5
+    T[lower] = 0.5 * (2. * U[lower])**(1. / D)
+    T[~lower] = 1. - 0.5 * (2. * (1. - U[~lower]))**(1. / D)
+    return T
+
+
+def _interval_fraction(T, D):
+    """ Fraction of the volume of a D dimensional interval between t=0 and
+    t=1 which lies before times T, the inverse of _interval_time"""
+    W = np.empty(T.shape)
+    lower = T < 0.5
+    W[lower] = 0.5 * (2. * T[lower])**D
+    W[~lower] = 1. - 0.5 * (2. * (1. - T[~lower]))**D
+    return W
+
+
+def _ball_directions(N, d, rng):
+    """ Return N uniformly random unit vectors in d dimensions"""
+    X = rng.standard_normal((N, d))
+    X /= np.sqrt(np.sum(X * X, axis=1)).reshape(N, 1)
+    return X
 
 
-def minkowski_interval(N, D, fix_ends=True, method='scatter'):
+def minkowski_interval(N, D, fix_ends=True, method='scatter', seed=None,
+                       dtype=float):
     """ Scatter N points in a D dimensional interval in Minkowski space
 
     Available methods are:
@@ -114,59 +625,81 @@ def minkowski_interval(N, D, fix_ends=True, method='scatter'):
                This is slow for large D - something like 2^D slowdown
 
     map -- map D unit cube to the relevant interval respecting volume elements
-           not yet implemented
+           every point is accepted so this is fast for any D
+
+    seed -- random seed or generator, see check_random_state
+    dtype -- floating point type of the returned coordinates
+             Points are sampled in double precision and then converted, so
+             np.float32 halves the memory with coordinates accurate to
+             about 6e-8, but relations of pairs that close to the light
+             cone may change
     """
     if method == 'scatter':
-        return minkowski_interval_scatter(N, D, fix_ends)
+        R = minkowski_interval_scatter(N, D, fix_ends, seed)
     elif method == 'map':
-        return minkowski_interval_map(N, D, fix_ends)
+        R = minkowski_interval_map(N, D, fix_ends, seed)
     else:
         assert False, 'Invalid method %s given to minkowski_interval' % method
+    return R.astype(dtype, copy=False)
 
 
-def sphere_surface_cartesian(N, D):
+def sphere_surface_cartesian(N, D, seed=None, dtype=float):
     """ Generate N points uniformly sampled from surface of a D-sphere
 
     Return Cartesian coordinates
     Using normal distributions as multivariate normal is spherically symmetric
+    dtype - floating point type of the returned coordinates, see
+            minkowski_interval
     """
-    R = np.random.randn(N, D + 1)
+    rng = dag.check_random_state(seed)
+    R = rng.standard_normal((N, D + 1))
     R_sq = R * R
     R_sq_sum = np.sqrt(np.sum(R_sq, axis=1))
     R_norm = R_sq_sum.reshape(N, 1)
-    return R / R_norm
+    return (R / R_norm).astype(dtype, copy=False)
 
 
-def sphere_surface_angular(N, D):
-    """ Generate N points uniformly sampled from surface of a D-sphere"""
-    X = sphere_surface_cartesian(N, D)
-    R = np.zeros((N, D))
-    for i in range(N):
-        R[i, :] += dag.cartesian_to_angular(X[i, :])
-    return R
+def sphere_surface_angular(N, D, seed=None, dtype=float):
+    """ Generate N points uniformly sampled from surface of a D-sphere
+
+    dtype - floating point type of the returned coordinates, see
+            minkowski_interval"""
+    R = dag.cartesian_to_angular(sphere_surface_cartesian(N, D, seed))
+    return R.astype(dtype, copy=False)
 
 
-def hyperbolic_disk(N, R, a=1.):
+def hyperbolic_disk(N, R, a=1., seed=None, dtype=float):
     """ Scatter N points in a 2 dimensional hyperbolic manifold with curvature a
 
     The points are scattered uniformly with inside a disk of radius R
     We are using the native representation, where polar coordinate r
-    is the hyperbolic distance to the origin"""
-    X = np.random.rand(N, 2)
+    is the hyperbolic distance to the origin
+    dtype - floating point type of the returned coordinates, see
+            minkowski_interval"""
+    rng = dag.check_random_state(seed)
+    X = rng.uniform(size=(N, 2))
     X[:, 1] *= (2. * np.pi)
     A_R = np.cosh(R * a) - 1.
     X[:, 0] = np.arccosh((X[:, 0] * A_R) + 1.) / a
-    return X
+    return X.astype(dtype, copy=False)
+
+def de_sitter_interval(N, D, KT2, fix_ends=False, method='scatter', seed=None,
+                       dtype=float):
+    """ Scatter N points in a D dimensional interval in de Sitter spacetime
 
-def de_sitter_interval(N, D, KT2, fix_ends=False, method='scatter'):
+    Methods are as for minkowski_interval, see de_sitter_interval_scatter
+    and de_sitter_interval_map
+    dtype - floating point type of the returned coordinates, see
+            minkowski_interval"""
     if method == 'scatter':
-        return de_sitter_interval_scatter(N, D, KT2, fix_ends)
+        R = de_sitter_interval_scatter(N, D, KT2, fix_ends, seed)
     elif method == 'map':
-        return de_sitter_interval_map(N, D, KT2, fix_ends)
+        R = de_sitter_interval_map(N, D, KT2, fix_ends, seed)
     else:
         assert False, 'Invalid method %s given to de_sitter_interval' % method
+    return R.astype(dtype, copy=False)
 
-def de_sitter_interval_scatter(N, D, KT2, fix_ends=False):
+def de_sitter_interval_scatter(N, D, KT2, fix_ends=False, seed=None):
     """ Scatter N points in a D dimensional interval in de Sitter spacetime
 
     This function uses the method described in Meyer1988 - a rejection method
@@ -175,23 +708,118 @@ def de_sitter_interval_scatter(N, D, KT2, fix_ends=False):
 
     """
     assert 0. < (KT2) < 4., 'KT^2 must be between 0 and 4 for this method'
-    Z = np.empty(shape=(0, D))
-
-    # rejection method
-    # go in batches of size N
-    while Z.shape[0] < N:
-        R = minkowski_interval(N, D, fix_ends=fix_ends)
-        R[:, 1:] -= 0.5 # fix back to 0 centre spatially
-        M = (1. - (KT2 * 0.25))**(-D)  # maximum value
-        m = np.random.rand(N) * M           # random assignments in that range
-        S = (-1. * R[:,0]**2) + np.sum(R[:,1:]**2, axis=1) # proper time for each point
+    rng = dag.check_random_state(seed)
+    M = (1. - (KT2 * 0.25))**(-D)  # maximum value
+
+    def accept(R):
+        m = rng.uniform(size=R.shape[0]) * M  # random assignments in that range
+        S = (-1. * R[:,0]**2) + np.sum((R[:,1:] - 0.5)**2, axis=1) # proper time for each point
         sigma = (1. + (0.25 * KT2 * S))**(-D)
-        Z = np.concatenate([Z, R[m < sigma]], axis=0)
+        return _in_minkowski_interval(R) & (m < sigma)
+
+    # rejection method - sigma is at least 1 so at least 1/M of the points
+    # in the interval are accepted
+    Z = rejection_sample(N, lambda n: rng.uniform(size=(n, D)), accept,
+                         minkowski_interval_volume(D) / M)
+    Z[:, 1:] -= 0.5 # fix back to 0 centre spatially
     if fix_ends:
         Z[0,:] = 0.
         Z[1,:] = 0.
         Z[1,0] = 1.
-    return Z[:N]
+    return Z
 
-def de_sitter_interval_map(N, D, KT2, fix_ends=False):
-    assert False, 'Not implemented yet'
+def de_sitter_interval_map(N, D, KT2, fix_ends=False, seed=None):
+    """ Scatter N points in a D dimensional interval in de Sitter spacetime
+
+    Points are drawn directly from the conformally weighted density
+    sigma=(1+K/4(ds^2))^-D used by de_sitter_interval_scatter, so none are
+    rejected however large KT2 is.
+
+    Notes
+    -----
+
+    Write the time of a point as w, the flat space volume fraction of the
+    interval below it, and its radius as v = (r / r_max(t))^(D-1). Then
+    the flat interval is uniform in (w, v) and the de Sitter density is
+    proportional to sigma. The inverse cumulative distributions of w, and of
+    v for each value of w, are tabulated numerically and cached for each
+    (D, KT2), see de_sitter_map_tables.
+    """
+    assert KT2 < 4., 'KT^2 must be less than 4 for this method'
+    rng = dag.check_random_state(seed)
+    d = D - 1
+    w_grid, w_inverse, v_inverse = de_sitter_map_tables(D, KT2)
+    n_w = len(w_grid) - 1
+    n_u = v_inverse.shape[1] - 1
+
+    W = np.interp(rng.uniform(size=N), w_inverse, w_grid)
+    T = _interval_time(W, D)
+    Z = np.zeros((N, D))
+    Z[:, 0] = T
+    if d > 0:
+        # choose the neighbouring table row at random, weighted by distance,
+        # which linearly interpolates the conditional density between rows
+        k = np.searchsorted(w_grid, W, side='right') - 1
+        k = np.clip(k, 0, n_w - 1)
+        frac = (W - w_grid[k]) / (w_grid[k + 1] - w_grid[k])
+        k += (rng.uniform(size=N) < frac)
+        u = rng.uniform(size=N) * n_u
+        j = np.minimum(u.astype(int), n_u - 1)
+        V = v_inverse[k, j] + (u - j) * (v_inverse[k, j + 1] - v_inverse[k, j])
+        radius = np.minimum(T, 1. - T) * V**(1. / d)
+        Z[:, 1:] = _ball_directions(N, d, rng) * radius.reshape(N, 1)
+    if fix_ends:
+        Z[0,:] = 0.
+        Z[1,:] = 0.
+        Z[1,0] = 1.
+    return Z
+
+
+def de_sitter_map_tables(D, KT2):
+    """ Return tabulated inverse cumulative distributions for de Sitter map
+
+    Returns
+    -------
+
+    w_grid - grid of flat space volume fractions w in [0, 1], at evenly
+             spaced times so that the tables resolve sigma near the tips
+    w_inverse - cumulative distribution of w at each point of w_grid
+    v_inverse - 2D array, row k is the inverse cumulative distribution of v
+                at w_grid[k], evaluated on an even grid in [0, 1]
+
+    Tables are cached for each (D, KT2) in DE_SITTER_MAP_TABLES
+    """
+    key = (D, float(KT2))
+    if key in DE_SITTER_MAP_TABLES:
+        return DE_SITTER_MAP_TABLES[key]
+    d = D - 1
+    T = np.linspace(0., 1., DE_SITTER_MAP_GRID[0] + 1)
+    w_grid = _interval_fraction(T, D)
+    v_grid = np.linspace(0., 1., DE_SITTER_MAP_GRID[1] + 1)
+    r_max = np.minimum(T, 1. - T)
+    if d > 0:
+        r = r_max[:, np.newaxis] * v_grid[np.newaxis, :]**(1. / d)
+    else:
+        r = np.zeros((len(w_grid), 1))
+    S = r * r - (T * T)[:, np.newaxis]
+    sigma = (1. + (0.25 * KT2 * S))**(-D)
+
+    # conditional distribution of v at each w, and marginal density of w
+    if d > 0:
+        dv = 0.5 * (sigma[:, 1:] + sigma[:, :-1]) * (v_grid[1] - v_grid[0])
+        v_cdf = np.zeros(sigma.shape)
+        v_cdf[:, 1:] = np.cumsum(dv, axis=1)
+        density = v_cdf[:, -1].copy()
+        v_cdf /= density[:, np.newaxis]
+        v_inverse = np.array([np.interp(v_grid, row, v_grid) for row in v_cdf])
+    else:
+        density = sigma[:, 0]
+        v_inverse = np.zeros((len(w_grid), 2))
+    dw = 0.5 * (density[1:] + density[:-1]) * np.diff(w_grid)
+    w_inverse = np.zeros(len(w_grid))
+    w_inverse[1:] = np.cumsum(dw)
+    w_inverse /= w_inverse[-1]
+
+    tables = (w_grid, w_inverse, v_inverse)
+    DE_SITTER_MAP_TABLES[key] = tables
+    return tables
@@ -11,11 +11,14 @@ __author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
 
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
 
+import dagology as dag
 
-__all__ = ['cube_space_graph']
+__all__ = ['cube_space_graph',
+           'cube_space_relation']
 
-def cube_space_graph(N, D, p=1.0):
+def cube_space_graph(N, D, p=1.0, hasse=False, seed=None):
     """
     Create a cube space DAG
 
@@ -26,6 +29,10 @@ def cube_space_graph(N, D, p=1.0):
     N - number of vertices in DAG
     D - dimension of box space
     p - probability with which allowed edges appear
+    hasse - if True, only include the links (the transitive reduction).
+            Thinning the links would not give the reduction of the thinned
+            relation, so p must be 1
+    seed - random seed or generator, see check_random_state
 
     Notes
     -----
@@ -35,14 +42,133 @@ def cube_space_graph(N, D, p=1.0):
     D=1 is a random DAG
     D=2 is equivalent to Minkowski space with D=2.
     """
-    R = np.random.random((N, D))
+    rng = dag.check_random_state(seed)
+    R = rng.uniform(size=(N, D))
+    A = cube_space_relation(R, p, hasse, seed=rng)
     G = nx.DiGraph()
-    edge_list = []
-    for i in range(N):
-        G.add_node(i, position=tuple(R[i]))
-        for j in range(N):
-            if (R[i] > R[j]).all():
-                if p == 1. or p > np.random.random():
-                    edge_list.append([j,i])
-    G.add_edges_from(edge_list)
+    G.add_nodes_from((i, {'position': tuple(R[i])}) for i in range(N))
+    G.add_edges_from(zip(*A.nonzero()))
     return G
+
+
+def cube_space_relation(R, p=1.0, hasse=False, block_size=None, seed=None):
+    """
+    Return the dominance relation of a set of points as a sparse matrix
+
+    Parameters
+    ----------
+
+    R - NxD numpy array of coordinates
+    p - probability with which allowed edges appear
+    hasse - if True, only return the links (the transitive reduction), and
+            p must be 1
+    block_size - number of points whose relations are computed at once
+    seed - random seed or generator used for thinning, see check_random_state
+
+    Returns
+    -------
+
+    A - NxN scipy.sparse CSR boolean matrix, A[i,j] is True iff R[i] is
+        smaller than R[j] in every coordinate
+
+    Notes
+    -----
+
+    Points are sorted on the first coordinate, so a point can only dominate
+    those before it in this order. Each other coordinate is replaced by its
+    rank, and the set of points below a point in each coordinate is a
+    bitset. Dominated sets are the intersections of these bitsets, computed
+    a block of points at a time.
+
+    Links are found during the same sweep. For D=1 they join each group of
+    points with equal coordinates to the next group, and for D=2 they are
+    the staircase of maximal points in each dominated set, comparing ranks
+    so that points sharing a coordinate do not hide each other. Otherwise the links below a point are its dominated set
+    with the dominated sets of all its members removed.
+    Thinning with probability p is applied to the returned edges.
+    """
+    if hasse and p < 1:
+        assert False, 'ERROR - hasse=True is only valid with p=1'
+    N, D = R.shape
+    order = np.argsort(R[:, 0], kind='mergesort')
+    R = R[order]
+    # rank[k][i] is the number of points strictly below point i in dim k
+    ranks = [np.searchsorted(np.sort(R[:, k]), R[:, k], side='left')
+             for k in range(D)]
+    if block_size is None:
+        block_size = int(max(1, dag.utils.BLOCK_MEMORY // (4 * max(N, 1))))
+    rows, cols = [], []
+    if hasse and D == 1:
+        # a weak order, each group of tied points links to the next group
+        starts = np.flatnonzero(np.append(True, np.diff(ranks[0]) > 0))
+        sizes = np.diff(np.append(starts, N))
+        group = np.repeat(np.arange(len(starts)), sizes)
+        counts = np.append(sizes[1:], 0)[group]
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) -
+                                                      counts, counts)
+        rows.append(np.repeat(np.arange(N), counts))
+        cols.append(np.repeat(np.append(starts[1:], N)[group], counts) +
+                    offsets)
+    else:
+        if hasse and D > 2:
+            bits = np.zeros((N, (N + 63) // 64), dtype=np.uint64)
+        for start in range(0, N, block_size):
+            stop = min(start + block_size, N)
+            block = _dominated_bits(ranks, start, stop)
+            if not hasse:
+                i, j = np.nonzero(dag.unpack_rows(block, N))
+                rows.append(j)
+                cols.append(i + start)
+            elif D == 2:
+                members = dag.unpack_rows(block, N)
+                for i in range(start, stop):
+                    j = np.flatnonzero(members[i - start])[::-1]
+                    x, y = ranks[0][j], ranks[1][j]
+                    # j is a link unless a point with a larger x is also
+                    # above it, so take the highest point of the earlier
+                    # groups of equal x
+                    new = np.append(True, x[1:] != x[:-1])
+                    first = np.maximum.accumulate(
+                        np.where(new, np.arange(len(j)), 0))
+                    higher = np.append(-1, np.maximum.accumulate(y))[first]
+                    links = j[y >= higher]
+                    rows.append(links)
+                    cols.append(np.repeat(i, len(links)))
+            else:
+                bits[start:stop] = block
+                for i in range(start, stop):
+                    j = np.flatnonzero(dag.unpack_rows(bits[i:i + 1], N)[0])
+                    covered = np.bitwise_or.reduce(bits[j], axis=0)
+                    links = dag.unpack_rows(
+                        (bits[i] & ~covered).reshape(1, -1), N)
+                    links = np.flatnonzero(links[0])
+                    rows.append(links)
+                    cols.append(np.repeat(i, len(links)))
+
+    if rows:
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+    else:
+        rows, cols = np.zeros(0, dtype=int), np.zeros(0, dtype=int)
+    if p != 1.:
+        keep = dag.check_random_state(seed).uniform(size=len(rows)) < p
+        rows, cols = rows[keep], cols[keep]
+    data = np.ones(len(rows), dtype=bool)
+    A = sp.csr_matrix((data, (order[rows], order[cols])), shape=(N, N))
+    A.sort_indices()
+    return A
+
+
+def _dominated_bits(ranks, start, stop):
+    """ Bitsets of the points dominated by points start:stop
+
+    Points are assumed sorted on the first coordinate, so only points
+    before stop need to be compared."""
+    N = len(ranks[0])
+    bits = None
+    for rank in ranks:
+        below = rank[np.newaxis, :stop] < rank[start:stop, np.newaxis]
+        if bits is None:
+            bits = dag.pack_rows(below, N)
+        else:
+            bits &= dag.pack_rows(below, N)
+    return bits
@@ -0,0 +1,104 @@
+"""
+Ensembles of independent realisations of random DAG models
+"""
+
+#    Copyright (C) 2016 by
+#    James Clough <james.clough91@gmail.com>
+#    All rights reserved.
+#    BSD license.
+
+__author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
+
+import numbers
+from multiprocessing import Pool
+
+import numpy as np
+
+import dagology as dag
+
+__all__ = ['ensemble',
+           'spawn_seeds']
+
+
+def ensemble(generator, M, args=(), kwargs=None, seed=None, processes=1):
+    """
+    Generate M independent realisations of a random model
+
+    Parameters
+    ----------
+
+    generator - function which accepts a seed keyword argument, such as
+                causal_set_graph, minkowski_interval or random_dag
+    M - int - number of realisations
+    args - tuple of positional arguments for generator
+    kwargs - dict of keyword arguments for generator
+    seed - random seed for the whole ensemble, see spawn_seeds
+    processes - number of worker processes, None to use every CPU
+
+    Returns
+    -------
+
+    list of the M results of generator
+
+    Notes
+    -----
+
+    Each realisation gets its own child seed, fixed before any work is
+    distributed, so results are identical for any number of processes.
+    """
+    if kwargs is None:
+        kwargs = {}
+    tasks = [(generator, args, kwargs, s) for s in spawn_seeds(seed, M)]
+    if processes == 1:
+        return [_realise(task) for task in tasks]
+    pool = Pool(processes)
+    try:
+        return pool.map(_realise, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def spawn_seeds(seed, M):
+    """
+    Return M independent child seeds derived from one seed
+
+    Parameters
+    ----------
+
+    seed - None, int, or anything accepted by check_random_state
+    M - int - number of child seeds
+
+    Returns
+    -------
+
+    list of M seeds, each accepted by check_random_state
+
+    Notes
+    -----
+
+    Where numpy provides SeedSequence the children come from
+    SeedSequence.spawn, otherwise they are distinct integer seeds drawn
+    from the generator given by seed, redrawing any repeats so that no two
+    realisations are the same.
+    """
+    if hasattr(np.random, 'SeedSequence'):
+        if seed is None or isinstance(seed, numbers.Integral):
+            seed = np.random.SeedSequence(seed)
+        if isinstance(seed, np.random.SeedSequence):
+            return seed.spawn(M)
+    rng = dag.check_random_state(seed)
+    seeds, seen = [], set()
+    while len(seeds) < M:
+        for s in rng.randint(0, 2**32, size=M - len(seeds), dtype=np.int64):
+            s = int(s)
+            if s not in seen:
+                seen.add(s)
+                seeds.append(s)
+    return seeds
+
+
+def _realise(task):
+    """ Run one realisation of an ensemble"""
+    generator, args, kwargs, seed = task
+    return generator(*args, seed=seed, **kwargs)
@@ -11,42 +11,130 @@ __author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
 
 import networkx as nx
 import numpy as np
-from random import randrange
 
 import dagology as dag
 
-__all__ = ['random_dag']
+__all__ = ['random_dag',
+           'random_dag_edges',
+           'random_dag_ensemble']
 
-def random_dag(degree_sequence):
+def random_dag(degree_sequence, seed=None):
     """ Create a random DAG from a given degree sequence
-    
+
     Parameters
     ----------
-    
+
     degree_sequence - list of pairs of in, out degrees
     all edges go from earlier to later in this list
-    
+    seed - random seed or generator, see check_random_state
+
     Returns
     -------
-    
+
     NetworkX DiGraph
     """
     G = nx.DiGraph()
     G.add_nodes_from(range(len(degree_sequence)))
-    remaining_stubs = [] # list of forward pointing stubs
+    G.add_edges_from(random_dag_edges(degree_sequence, seed).tolist())
+    return G
+
+def random_dag_edges(degree_sequence, seed=None):
+    """ Create the edges of a random DAG from a given degree sequence
+
+    Parameters
+    ----------
+
+    degree_sequence - list of pairs of in, out degrees
+    all edges go from earlier to later in this list
+    seed - random seed or generator, see check_random_state
+
+    Returns
+    -------
+
+    edges - Ex2 numpy array of edges (older node, newer node)
+
+    Notes
+    -----
+
+    The unmatched forward stubs are counted per node in a Fenwick tree, so
+    a random stub can be drawn in O(log N) time. While a node is matched
+    the nodes it is already connected to are given weight zero, to avoid
+    multiedges, so each in-stub is matched uniformly at random among the
+    allowed stubs without any redrawing.
+    """
+    uniform = _uniforms(dag.check_random_state(seed))
+    N = len(degree_sequence)
+    n_edges = sum(indegree for indegree, outdegree in degree_sequence)
+    edges = np.zeros((n_edges, 2), dtype=int)
+    tree = [0] * (N + 1) # Fenwick tree of the unmatched stubs of each node
+    stubs = [0] * N # number of unmatched stubs of each node
+    total = 0 # unmatched stubs of nodes not yet chosen
+    e = 0
     for node, degrees in enumerate(degree_sequence):
         indegree, outdegree = degrees
-        allowed_stubs = remaining_stubs[:]
+        chosen = []
         for x in range(indegree):
-            if len(allowed_stubs) == 0:
+            if total == 0:
                 # raise networkx error
                 assert False, 'Not a valid degree sequence'
-            older_node = allowed_stubs.pop(randrange(len(allowed_stubs)))
-            remaining_stubs.remove(older_node)
+            older_node = _fenwick_find(tree, int(next(uniform) * total))
             # be careful about multiedges
-            allowed_stubs = [x for x in allowed_stubs if x != older_node]
-            G.add_edge(older_node, node)
-        for x in range(outdegree):
-            remaining_stubs.append(node)
-    return G
-    
+            _fenwick_add(tree, older_node, -stubs[older_node])
+            total -= stubs[older_node]
+            stubs[older_node] -= 1
+            chosen.append(older_node)
+            edges[e] = older_node, node
+            e += 1
+        stubs[node] = outdegree
+        for older_node in chosen + [node]:
+            _fenwick_add(tree, older_node, stubs[older_node])
+            total += stubs[older_node]
+    return edges
+
+def random_dag_ensemble(degree_sequence, M, as_graph=True, seed=None,
+                        processes=1):
+    """ Create M independent random DAGs from one degree sequence
+
+    Parameters
+    ----------
+
+    degree_sequence - list of pairs of in, out degrees
+    M - int - number of DAGs to create
+    as_graph - if True return NetworkX DiGraphs, otherwise edge arrays
+    seed - random seed for the ensemble, see spawn_seeds
+    processes - number of worker processes, see ensemble
+
+    Returns
+    -------
+
+    list of M NetworkX DiGraphs, or of Ex2 numpy arrays of edges
+    """
+    degree_sequence = [tuple(degrees) for degrees in degree_sequence]
+    generator = random_dag if as_graph else random_dag_edges
+    return dag.ensemble(generator, M, (degree_sequence,), seed=seed,
+                        processes=processes)
+
+def _uniforms(rng, batch=4096):
+    """ Yield uniform random numbers in [0, 1) drawn from rng in batches"""
+    while True:
+        for u in rng.uniform(size=batch).tolist():
+            yield u
+
+def _fenwick_add(tree, i, delta):
+    """ Add delta to the weight of item i of a Fenwick tree"""
+    i += 1
+    while i < len(tree):
+        tree[i] += delta
+        i += i & -i
+
+def _fenwick_find(tree, target):
+    """ Return the first item of a Fenwick tree whose cumulative weight
+    exceeds target"""
+    i = 0
+    step = 1 << (len(tree) - 1).bit_length()
+    while step:
+        if i + step < len(tree) and tree[i + step] <= target:
+            i += step
+            target -= tree[i]
+        step >>= 1
+    return i
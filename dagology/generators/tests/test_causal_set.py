@@ -4,6 +4,9 @@ from nose.tools import assert_in
 from nose.tools import assert_raises
 from nose.tools import assert_true
 
+import shutil
+import tempfile
+
 import networkx as nx
 import numpy as np
 import dagology as dag
@@ -36,6 +39,140 @@ class TestCausalSet(object):
         assert_equal(G_boundary.number_of_edges(), 4)
         assert_equal(G_periodic.number_of_edgeS(), 5)
 
+class TestCausalSetRelation(object):
+    """ Unit tests for the blocked causal relation builder"""
+    def naive_relation(self, R, periodic=None):
+        N = R.shape[0]
+        A = np.zeros((N, N), dtype=bool)
+        for i in range(N):
+            for j in range(N):
+                if R[i, 0] < R[j, 0]:
+                    if periodic:
+                        A[i, j] = dag.minkowski_periodic(R[i], R[j],
+                                                         list(periodic)) < 0
+                    else:
+                        A[i, j] = dag.minkowski(R[i], R[j]) < 0
+        return A
+
+    def test_matches_naive(self):
+        R = np.random.random((60, 3))
+        A_naive = self.naive_relation(R)
+        for block_size in [1, 7, 60, 100]:
+            A = dag.causal_set_relation(R, block_size=block_size)
+            assert_true(np.array_equal(A.toarray(), A_naive))
+
+    def test_periodic_matches_naive(self):
+        R = np.random.random((60, 2))
+        R[:, 0] *= 3.
+        A_naive = self.naive_relation(R, [1.])
+        A = dag.causal_set_relation(R, periodic=[1.], block_size=13)
+        assert_true(np.array_equal(A.toarray(), A_naive))
+
+    def test_thinning_subset(self):
+        R = np.random.random((60, 2))
+        A = dag.causal_set_relation(R)
+        A_thin = dag.causal_set_relation(R, 0.5, block_size=9)
+        assert_true(A_thin.nnz < A.nnz)
+        assert_equal((A_thin > A).nnz, 0)
+
+    def test_index_matches_block(self):
+        for D in [2, 3, 4]:
+            R = np.random.random((300, D))
+            R[:, 0] *= 0.2
+            R[:, 1:] *= 3.
+            A = dag.causal_set_relation(R)
+            A_index = dag.causal_set_relation(R, method='index', block_size=5)
+            assert_true(A.nnz > 0)
+            assert_equal((A != A_index).nnz, 0)
+
+    def test_index_periodic_matches_block(self):
+        for period in [[0.3], [1., 0.5], [2., 3.]]:
+            R = np.random.random((300, 3))
+            R[:, 0] *= 0.2
+            R[:, 1] *= period[0]
+            R[:, 2] *= period[-1]
+            A = dag.causal_set_relation(R, periodic=period)
+            A_index = dag.causal_set_relation(R, periodic=period,
+                                              method='index')
+            assert_equal((A != A_index).nnz, 0)
+
+    def test_graph_edges(self):
+        R = np.random.random((50, 2))
+        G = dag.causal_set_graph(R)
+        A = dag.causal_set_relation(R)
+        assert_equal(G.number_of_edges(), A.nnz)
+        for i, j in G.edges():
+            assert_true(A[i, j])
+        assert_equal(G.nodes[3]['position'], tuple(R[3]))
+
+class TestCausalSetLinks(object):
+    """ Unit tests for generating only the links of a causal set"""
+    def naive_links(self, A):
+        A = A.toarray().astype(int)
+        C = np.dot(A, A)
+        return (A > 0) & (C == 0)
+
+    def test_matches_reduction(self):
+        for D in [2, 3, 4]:
+            R = dag.minkowski_interval(150, D)
+            A = dag.causal_set_relation(R)
+            L = dag.causal_set_links(R, block_size=11)
+            assert_true(np.array_equal(L.toarray(), self.naive_links(A)))
+
+    def test_periodic(self):
+        # the minimum image relation is transitive, so links are still exact
+        R = np.random.random((120, 3))
+        A = dag.causal_set_relation(R, periodic=0.3)
+        L = dag.causal_set_links(R, periodic=0.3, block_size=13)
+        assert_true(np.array_equal(L.toarray(), self.naive_links(A)))
+
+    def test_graph(self):
+        R = dag.minkowski_interval(60, 2)
+        G = dag.causal_set_graph(R, hasse=True)
+        L = dag.causal_set_links(R)
+        assert_equal(G.number_of_nodes(), 60)
+        assert_equal(G.number_of_edges(), L.nnz)
+        assert_raises(AssertionError, dag.causal_set_graph, R, 0.5,
+                      hasse=True)
+
+    def test_thinning(self):
+        R = dag.minkowski_interval(60, 2)
+        L = dag.causal_set_links(R)
+        L_thin = dag.causal_set_links(R, 0.5)
+        assert_equal((L_thin > L).nnz, 0)
+        assert_equal(dag.causal_set_links(R, 0.).nnz, 0)
+
+class TestCausalSetStreaming(object):
+    """ Unit tests for streaming causal sets in blocks and to disk"""
+    def setup(self):
+        self.path = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.path)
+
+    def test_blocks(self):
+        R = np.random.random((70, 2))
+        A = dag.causal_set_relation(R)
+        rows = 0
+        for start, stop, B in dag.causal_set_edge_blocks(R, block_size=8):
+            assert_equal(B.shape, (stop - start, 70))
+            assert_equal((A[start:stop] != B).nnz, 0)
+            rows += stop - start
+        assert_equal(rows, 70)
+
+    def test_save_load(self):
+        R = np.random.random((70, 3))
+        A = dag.causal_set_relation(R)
+        dag.save_causal_set(self.path, R, block_size=9)
+        R_, A_ = dag.load_causal_set(self.path)
+        assert_true(np.array_equal(R, R_))
+        assert_equal((A != A_).nnz, 0)
+        for start, stop, B in dag.load_causal_set_blocks(self.path):
+            assert_equal((A[start:stop] != B).nnz, 0)
+            # the mapped indices are used in place, not upcast
+            assert_equal(B.indices.dtype, B.indptr.dtype)
+            assert_false(B.indices.flags.owndata)
+
 class TestMinkowskiInterval(object):
     """ Unit tests for minkowski_interval"""
     def test_shape(self):
@@ -62,6 +199,37 @@ class TestMinkowskiInterval(object):
         assert_true(0. < R[0, 0] < 1.)
         assert_true(R[0, 1] != 0.5)
 
+    def test_scatter_inside_interval(self):
+        for D in [1, 2, 5]:
+            R = dag.minkowski_interval(500, D, fix_ends=False)
+            assert_equal(R.shape, (500, D))
+            r = np.sqrt(np.sum((R[:, 1:] - 0.5)**2, axis=1))
+            assert_true((r <= np.minimum(R[:, 0], 1. - R[:, 0])).all())
+
+    def test_map_inside_interval(self):
+        for D in [1, 2, 4, 8]:
+            R = dag.minkowski_interval(500, D, fix_ends=False, method='map')
+            assert_equal(R.shape, (500, D))
+            r = np.sqrt(np.sum((R[:, 1:] - 0.5)**2, axis=1))
+            assert_true((r <= np.minimum(R[:, 0], 1. - R[:, 0])).all())
+
+    def test_map_fix_ends(self):
+        R = dag.minkowski_interval(100, 3, fix_ends=True, method='map')
+        assert_true(np.array_equal(R[0], [0., 0.5, 0.5]))
+        assert_true(np.array_equal(R[1], [1., 0.5, 0.5]))
+
+    def test_map_distribution(self):
+        # compare against rejection sampling in the unit cube
+        N = 20000
+        D = 3
+        R_map = dag.minkowski_interval(N, D, fix_ends=False, method='map')
+        R_scatter = dag.minkowski_interval(N, D, fix_ends=False)
+        r_map = np.sqrt(np.sum((R_map[:, 1:] - 0.5)**2, axis=1))
+        r_scatter = np.sqrt(np.sum((R_scatter[:, 1:] - 0.5)**2, axis=1))
+        assert_true(abs(np.mean(R_map[:, 0]) - 0.5) < 0.01)
+        assert_true(abs(np.mean(r_map) - np.mean(r_scatter)) < 0.01)
+        assert_true(abs(np.std(R_map[:, 0]) - np.std(R_scatter[:, 0])) < 0.01)
+
 class TestDeSitterInterval(object):
     """ Unit tests for de_sitter_interval"""
     def test_shape(self):
@@ -79,6 +247,39 @@ class TestDeSitterInterval(object):
         assert_true(0. < R[0, 0] < 1.)
         assert_true(R[0, 1] != 0.5)
 
+    def test_inside_interval(self):
+        for KT2 in [0.1, 2., 3.9]:
+            R = dag.de_sitter_interval(500, 3, KT2)
+            assert_equal(R.shape, (500, 3))
+            r = np.sqrt(np.sum(R[:, 1:]**2, axis=1))
+            assert_true((r <= np.minimum(R[:, 0], 1. - R[:, 0])).all())
+
+    def test_map_inside_interval(self):
+        for D in [1, 2, 4]:
+            for KT2 in [0.1, 2., 3.99]:
+                R = dag.de_sitter_interval(500, D, KT2, method='map')
+                assert_equal(R.shape, (500, D))
+                r = np.sqrt(np.sum(R[:, 1:]**2, axis=1))
+                assert_true((r <= np.minimum(R[:, 0], 1. - R[:, 0])).all())
+
+    def test_map_distribution(self):
+        # compare against the rejection method
+        N = 20000
+        for D in [2, 3]:
+            R_map = dag.de_sitter_interval(N, D, 2., method='map')
+            R_scatter = dag.de_sitter_interval(N, D, 2.)
+            r_map = np.sqrt(np.sum(R_map[:, 1:]**2, axis=1))
+            r_scatter = np.sqrt(np.sum(R_scatter[:, 1:]**2, axis=1))
+            assert_true(abs(np.mean(R_map[:, 0]) -
+                            np.mean(R_scatter[:, 0])) < 0.01)
+            assert_true(abs(np.mean(r_map) - np.mean(r_scatter)) < 0.01)
+            assert_true(abs(np.std(r_map) - np.std(r_scatter)) < 0.01)
+
+    def test_map_fix_ends(self):
+        R = dag.de_sitter_interval(100, 3, 0.5, fix_ends=True, method='map')
+        assert_true(np.array_equal(R[0], [0., 0., 0.]))
+        assert_true(np.array_equal(R[1], [1., 0., 0.]))
+
     def test_fix_ends_true(self):
         N = 100
         D = 2
@@ -87,3 +288,28 @@ class TestDeSitterInterval(object):
         assert_equal(R[0, 1], 0.)
         assert_equal(R[1, 0], 1.)
         assert_equal(R[1, 1], 0.)
+
+class TestSphereSurface(object):
+    """ Unit tests for sampling the surface of a sphere"""
+
+    def test_angular_matches_cartesian(self):
+        R = dag.generators.causal_set.sphere_surface_angular(50, 3, seed=4)
+        X = dag.generators.causal_set.sphere_surface_cartesian(50, 3, seed=4)
+        assert_equal(R.shape, (50, 3))
+        assert_true(np.allclose(dag.angular_to_cartesian(R), X))
+        assert_true(np.all(R[:, :-1] <= np.pi))
+        assert_true(np.all((R[:, -1] >= 0.) & (R[:, -1] < 2. * np.pi)))
+
+class TestCoordinateDtype(object):
+    """ Unit tests for the dtype of sampled coordinates"""
+
+    def test_float32(self):
+        R = dag.minkowski_interval(100, 3, method='map', seed=1)
+        R_32 = dag.minkowski_interval(100, 3, method='map', seed=1,
+                                      dtype=np.float32)
+        assert_equal(R_32.dtype, np.float32)
+        assert_true(np.allclose(R, R_32))
+        R_32 = dag.de_sitter_interval(50, 2, 0.5, seed=1, dtype=np.float32)
+        assert_equal(R_32.dtype, np.float32)
+        A = dag.causal_set_relation(R.astype(np.float32))
+        assert_true(A.nnz > 0)
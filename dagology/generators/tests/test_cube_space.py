@@ -5,6 +5,7 @@ from nose.tools import assert_raises
 from nose.tools import assert_true
 
 import networkx as nx
+import numpy as np
 import dagology as dag
 
 class TestCubeSpace(object):
@@ -22,3 +23,56 @@ class TestCubeSpace(object):
 
         G = dag.cube_space_graph(N, 1, 1.)
         assert_equal(G.number_of_edges(), (N*(N-1)/2))
+
+class TestCubeSpaceRelation(object):
+    """ Unit tests for the cube space dominance relation"""
+    def naive_relation(self, R):
+        N = R.shape[0]
+        A = np.zeros((N, N), dtype=bool)
+        for i in range(N):
+            for j in range(N):
+                A[j, i] = (R[i] > R[j]).all()
+        return A
+
+    def naive_hasse(self, A):
+        A = A.astype(int)
+        return (A > 0) & (np.dot(A, A) == 0)
+
+    def test_matches_naive(self):
+        for D in [1, 2, 3, 5]:
+            R = np.random.random((70, D))
+            A_naive = self.naive_relation(R)
+            for block_size in [1, 9, 100]:
+                A = dag.cube_space_relation(R, block_size=block_size)
+                assert_true(np.array_equal(A.toarray(), A_naive))
+
+    def test_hasse(self):
+        for D in [1, 2, 3, 4]:
+            R = np.random.random((70, D))
+            H = self.naive_hasse(self.naive_relation(R))
+            for block_size in [1, 9, 100]:
+                A = dag.cube_space_relation(R, hasse=True,
+                                            block_size=block_size)
+                assert_true(np.array_equal(A.toarray(), H))
+
+    def test_hasse_ties(self):
+        R = np.array([[0, 0], [1, 0], [1, 2], [2, 1], [3, 3]])
+        A = dag.cube_space_relation(R, hasse=True)
+        assert_true(A[0, 3])
+        rng = np.random.RandomState(5)
+        for D in [1, 2, 3]:
+            # lattice points, so many share coordinates
+            R = rng.randint(0, 6, size=(70, D))
+            H = self.naive_hasse(self.naive_relation(R))
+            for block_size in [1, 9, 100]:
+                A = dag.cube_space_relation(R, hasse=True,
+                                            block_size=block_size)
+                assert_true(np.array_equal(A.toarray(), H))
+
+    def test_hasse_thinning(self):
+        assert_raises(AssertionError, dag.cube_space_graph, 20, 2, 0.5,
+                      hasse=True)
+
+    def test_hasse_graph(self):
+        G = dag.cube_space_graph(100, 1, hasse=True)
+        assert_equal(G.number_of_edges(), 99)
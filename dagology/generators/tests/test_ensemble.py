@@ -0,0 +1,72 @@
+from nose.tools import assert_equal
+from nose.tools import assert_false
+from nose.tools import assert_in
+from nose.tools import assert_raises
+from nose.tools import assert_true
+
+import networkx as nx
+import numpy as np
+import dagology as dag
+
+
+class TestEnsemble(object):
+    """ Unit tests for ensembles of random models"""
+    def test_length(self):
+        X = dag.ensemble(dag.minkowski_interval, 4, (50, 2), seed=1)
+        assert_equal(len(X), 4)
+        for R in X:
+            assert_equal(R.shape, (50, 2))
+
+    def test_reproducible(self):
+        X_1 = dag.ensemble(dag.minkowski_interval, 4, (50, 3), seed=1)
+        X_2 = dag.ensemble(dag.minkowski_interval, 4, (50, 3), seed=1,
+                           processes=2)
+        for R_1, R_2 in zip(X_1, X_2):
+            assert_true(np.array_equal(R_1, R_2))
+
+    def test_independent(self):
+        X = dag.ensemble(dag.minkowski_interval, 2, (50, 3),
+                         {'fix_ends': False}, seed=1)
+        assert_false(np.array_equal(X[0], X[1]))
+
+    def test_kwargs(self):
+        X = dag.ensemble(dag.cube_space_graph, 3, (20, 2), {'p': 0.},
+                         seed=3)
+        for G in X:
+            assert_equal(G.number_of_edges(), 0)
+
+    def test_spawn_seeds(self):
+        assert_equal(dag.spawn_seeds(5, 3), dag.spawn_seeds(5, 3))
+        assert_equal(len(set(dag.spawn_seeds(5, 10))), 10)
+        # enough seeds that independent 32 bit draws would repeat
+        assert_equal(len(set(dag.spawn_seeds(1, 100000))), 100000)
+
+
+class TestSeeds(object):
+    """ Unit tests for seeding each generator"""
+    def test_generators(self):
+        generators = [(dag.minkowski_interval, (30, 3), {}),
+                      (dag.minkowski_interval, (30, 3), {'method': 'map'}),
+                      (dag.de_sitter_interval, (30, 3, 1.), {}),
+                      (dag.de_sitter_interval, (30, 3, 1.),
+                       {'method': 'map'})]
+        for generator, args, kwargs in generators:
+            R_1 = generator(*args, seed=11, **kwargs)
+            R_2 = generator(*args, seed=11, **kwargs)
+            assert_true(np.array_equal(R_1, R_2))
+
+    def test_graphs(self):
+        R = np.random.random((40, 2))
+        G_1 = dag.causal_set_graph(R, 0.5, seed=4)
+        G_2 = dag.causal_set_graph(R, 0.5, seed=4)
+        assert_equal(sorted(G_1.edges()), sorted(G_2.edges()))
+        G_1 = dag.cube_space_graph(40, 3, 0.5, seed=4)
+        G_2 = dag.cube_space_graph(40, 3, 0.5, seed=4)
+        assert_equal(sorted(G_1.edges()), sorted(G_2.edges()))
+
+    def test_random_state(self):
+        rng = np.random.RandomState(0)
+        R_1 = dag.minkowski_interval(30, 2, seed=rng)
+        R_2 = dag.minkowski_interval(30, 2, seed=rng)
+        assert_false(np.array_equal(R_1, R_2))
+        assert_raises(ValueError, dag.check_random_state, 'seed')
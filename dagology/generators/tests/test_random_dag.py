@@ -25,3 +25,54 @@ class TestRandomDag(object):
         assert_true(G.has_edge(0, 2))
         assert_true(G.has_edge(0, 3))        
         
+
+    def test_degrees(self):
+        # each node has at most one out-stub, so an in-stub is never
+        # blocked by a multiedge and every draw succeeds
+        degree_sequence = [[0, 1], [0, 1], [1, 1], [1, 1], [1, 1], [2, 0]]
+        for i in range(20):
+            G = dag.random_dag(degree_sequence)
+            for node, (indegree, outdegree) in enumerate(degree_sequence):
+                assert_equal(G.in_degree(node), indegree)
+                assert_equal(G.out_degree(node), outdegree)
+                for older in G.predecessors(node):
+                    assert_true(older < node)
+
+    def test_mostly_blocked(self):
+        # most unmatched stubs belong to hubs the node is already joined to
+        degree_sequence = [[0, 50]] * 4 + [[3, 0]] * 50
+        G = dag.random_dag(degree_sequence, seed=3)
+        assert_equal(G.number_of_edges(), 150)
+        for node in range(4, 54):
+            assert_equal(len(set(G.predecessors(node))), 3)
+            for older in G.predecessors(node):
+                assert_true(older < 4)
+
+    def test_invalid(self):
+        assert_raises(AssertionError, dag.random_dag, [[0, 1], [2, 0]])
+        assert_raises(AssertionError, dag.random_dag, [[0, 2], [2, 0]])
+
+    def test_ensemble(self):
+        degree_sequence = [[0, 2], [1, 1], [2, 0]]
+        graphs = dag.random_dag_ensemble(degree_sequence, 5)
+        assert_equal(len(graphs), 5)
+        for G in graphs:
+            assert_equal(G.number_of_edges(), 3)
+        edges = dag.random_dag_ensemble(degree_sequence, 3, as_graph=False)
+        assert_equal([e.shape for e in edges], [(3, 2)] * 3)
+
+    def test_seed(self):
+        degree_sequence = [[0, 1], [0, 1], [1, 1], [1, 1], [1, 1], [2, 0]]
+        G_1 = dag.random_dag(degree_sequence, seed=42)
+        G_2 = dag.random_dag(degree_sequence, seed=42)
+        assert_equal(sorted(G_1.edges()), sorted(G_2.edges()))
+
+    def test_ensemble_processes(self):
+        degree_sequence = [[0, 1], [0, 1], [1, 1], [1, 1], [1, 1], [2, 0]]
+        serial = dag.random_dag_ensemble(degree_sequence, 6, as_graph=False,
+                                         seed=7)
+        parallel = dag.random_dag_ensemble(degree_sequence, 6,
+                                           as_graph=False, seed=7,
+                                           processes=3)
+        for E_1, E_2 in zip(serial, parallel):
+            assert_true(np.array_equal(E_1, E_2))
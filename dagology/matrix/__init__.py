@@ -1,2 +1,3 @@
+from causal_matrix import *
 from matrix_utils import *
 from mds import *
@@ -0,0 +1,371 @@
+""" Bit-packed causal relation matrices"""
+
+#    Copyright (C) 2016 by
+#    James Clough <james.clough91@gmail.com>
+#    All rights reserved.
+#    BSD license.
+
+__author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
+
+import sys
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+import dagology as dag
+
+__all__ = ['CausalMatrix',
+           'pack_rows',
+           'unpack_rows',
+           'popcount']
+
+# number of set bits in each possible byte
+POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)],
+                          dtype=np.uint8)
+
+# position of the first set bit of each possible nonzero byte, in the
+# most significant first order of np.packbits
+FIRST_BIT_TABLE = np.array([8] + [7 - int(np.log2(i)) for i in range(1, 256)],
+                           dtype=np.int64)
+
+LITTLE_ENDIAN = sys.byteorder == 'little'
+
+# mean number of relations per row above which closure and reduction visit
+# only the links of each element rather than all of its relations
+DENSE_DEGREE = 32
+
+
+def n_words(N):
+    """ Number of 64 bit words needed to store a bitset of N elements"""
+    return (N + 63) // 64
+
+
+def pack_rows(mask, N=None):
+    """ Pack the rows of a boolean array into bitsets of 64 bit words
+
+    Parameters
+    ----------
+
+    mask - 2D array, nonzero entries are set bits
+    N - number of elements in each bitset, default to the width of mask
+        Columns of mask beyond its width are taken as unset
+
+    Returns
+    -------
+
+    2D uint64 array with n_words(N) words per row
+    """
+    n_rows, n_cols = mask.shape
+    if N is None:
+        N = n_cols
+    packed = np.zeros((n_rows, 8 * n_words(N)), dtype=np.uint8)
+    packed[:, :(n_cols + 7) // 8] = np.packbits(mask != 0, axis=1)
+    return packed.view(np.uint64)
+
+
+def unpack_rows(bits, N):
+    """ Unpack rows of 64 bit words into a boolean array with N columns"""
+    bits = np.ascontiguousarray(bits)
+    return np.unpackbits(bits.view(np.uint8), axis=1)[:, :N].astype(bool)
+
+
+def popcount(bits, axis=None):
+    """ Count the set bits in an array of 64 bit words
+
+    axis - None to count all bits, or -1 to count each row"""
+    counts = POPCOUNT_TABLE[np.ascontiguousarray(bits).view(np.uint8)]
+    if axis is None:
+        return int(np.sum(counts, dtype=np.int64))
+    return np.sum(counts, axis=axis, dtype=np.int64)
+
+
+class CausalMatrix(object):
+    """ Bit-packed NxN boolean matrix of a causal relation
+
+    Row i is stored as a bitset of 64 bit words, with bit j set iff there
+    is an edge from i to j, the same orientation as nx.adjacency_matrix.
+    This uses one bit per entry rather than the 64 of a float matrix, and
+    set operations on rows act on whole words at a time.
+
+    Attributes
+    ----------
+
+    bits - Nxn_words(N) uint64 array of packed rows
+    N - number of elements
+    """
+
+    def __init__(self, bits, N):
+        self.bits = bits
+        self.N = N
+
+    @property
+    def shape(self):
+        return (self.N, self.N)
+
+    @classmethod
+    def from_dense(cls, A):
+        """ Create from a dense NxN array, nonzero entries are relations"""
+        A = np.asarray(A)
+        N, _ = A.shape
+        assert N == _, 'Relation matrix must be square'
+        bits = np.zeros((N, n_words(N)), dtype=np.uint64)
+        block = _block_rows(N)
+        for start in range(0, N, block):
+            bits[start:start + block] = pack_rows(A[start:start + block])
+        return cls(bits, N)
+
+    @classmethod
+    def from_sparse(cls, A):
+        """ Create from a scipy.sparse NxN matrix, stored entries which are
+        nonzero are relations"""
+        A = sp.csr_matrix(A)
+        N, _ = A.shape
+        assert N == _, 'Relation matrix must be square'
+        bits = np.zeros((N, n_words(N)), dtype=np.uint64)
+        block = _block_rows(N)
+        for start in range(0, N, block):
+            bits[start:start + block] = pack_rows(
+                A[start:start + block].toarray())
+        return cls(bits, N)
+
+    @classmethod
+    def from_graph(cls, G, node_list=None):
+        """ Create from the edges of a NetworkX DiGraph
+
+        node_list - order of nodes for the rows, default to G.nodes()"""
+        if node_list is None:
+            node_list = list(G.nodes())
+        if len(node_list) == 0:
+            return cls(np.zeros((0, 0), dtype=np.uint64), 0)
+        return cls.from_sparse(nx.adjacency_matrix(G, node_list))
+
+    def copy(self):
+        return CausalMatrix(self.bits.copy(), self.N)
+
+    def to_dense(self, dtype=bool):
+        """ Return the relation as a dense NxN array"""
+        return unpack_rows(self.bits, self.N).astype(dtype)
+
+    def to_sparse(self):
+        """ Return the relation as an NxN scipy.sparse CSR boolean matrix"""
+        block = _block_rows(self.N)
+        blocks = [sp.csr_matrix(unpack_rows(self.bits[start:start + block],
+                                            self.N))
+                  for start in range(0, self.N, block)]
+        if not blocks:
+            return sp.csr_matrix((0, 0), dtype=bool)
+        return sp.vstack(blocks, format='csr')
+
+    def transpose(self):
+        """ Return the transposed relation, so rows become pasts"""
+        T = np.zeros(self.bits.shape, dtype=np.uint64)
+        block = 8 * max(1, _block_rows(self.N) // 8)
+        for start in range(0, self.N, block):
+            stop = min(start + block, self.N)
+            rows = unpack_rows(self.bits[start:stop], self.N)
+            # columns start:stop of the transpose, a whole number of bytes
+            T.view(np.uint8)[:, start // 8:(stop + 7) // 8] = \
+                np.packbits(rows.T, axis=1)
+        return CausalMatrix(T, self.N)
+
+    T = property(transpose)
+
+    def row(self, i):
+        """ Return row i as a boolean array"""
+        return unpack_rows(self.bits[i:i + 1], self.N)[0]
+
+    def column(self, j):
+        """ Return column j as a boolean array"""
+        byte = self.bits.view(np.uint8)[:, j // 8]
+        return (byte & (128 >> (j % 8))) > 0
+
+    def descendants(self, i):
+        """ Indices of the elements related to i by a row entry
+
+        These are all descendants of i when the matrix is closed"""
+        return np.flatnonzero(self.row(i))
+
+    def ancestors(self, j):
+        """ Indices of the elements related to j by a column entry
+
+        These are all ancestors of j when the matrix is closed"""
+        return np.flatnonzero(self.column(j))
+
+    def related(self, i, j):
+        """ Return True if there is a relation from i to j"""
+        return bool(self.bits.view(np.uint8)[i, j // 8] & (128 >> (j % 8)))
+
+    def number_of_relations(self):
+        """ Number of relations in the matrix"""
+        return popcount(self.bits)
+
+    def ordering_fraction(self):
+        """ Fraction of pairs of elements which are related
+
+        The matrix should be transitively closed"""
+        if self.N < 2:
+            return 0.
+        return self.number_of_relations() / (0.5 * self.N * (self.N - 1))
+
+    def row_counts(self):
+        """ Number of relations in each row"""
+        return popcount(self.bits, axis=-1)
+
+    def dot(self, v, dtype=float):
+        """ Return the matrix product of the relation with v
+
+        v - length N vector or NxM array
+        dtype - floating point type of the product
+
+        Rows are unpacked a block at a time so the product uses BLAS without
+        a dense copy of the whole matrix. Sums of integers are exact while
+        they stay below 2**53 in float64."""
+        v = np.asarray(v, dtype=dtype)
+        out = np.zeros((self.N,) + v.shape[1:], dtype=dtype)
+        block = _block_rows(v.dtype.itemsize * self.N)
+        for start in range(0, self.N, block):
+            rows = unpack_rows(self.bits[start:start + block], self.N)
+            out[start:start + block] = rows.astype(dtype).dot(v)
+        return out
+
+    def interval_size(self, a, b, transpose=None):
+        """ Number of elements in the interval [a, b], including a and b
+
+        The matrix should be transitively closed. A transpose computed
+        already may be given to save recomputing it.
+        Returns 1 if a == b and 0 if a does not precede b"""
+        if a == b:
+            return 1
+        if not self.related(a, b):
+            return 0
+        if transpose is None:
+            past_b = pack_rows(self.column(b)[np.newaxis, :])[0]
+        else:
+            past_b = transpose.bits[b]
+        return popcount(self.bits[a] & past_b) + 2
+
+    def topological_levels(self):
+        """ Antichains of elements in topological order, see
+        matrix_utils.topological_levels"""
+        return dag.topological_levels(self.to_sparse())
+
+    def closure(self):
+        """ Return the transitive closure of the relation
+
+        Elements are processed a topological level at a time from the
+        latest, and each row becomes its children together with the union
+        of their closed rows. For dense relations, such as ones which are
+        nearly closed already, see _link_sweep."""
+        A = self.to_sparse()
+        if A.nnz > DENSE_DEGREE * self.N:
+            return self._link_sweep(A)[0]
+        C = self.copy()
+        for level in reversed(dag.topological_levels(A)):
+            C.bits[level] |= _union_of_children(C.bits, A, level)
+        return C
+
+    def reduction(self):
+        """ Return the transitive reduction of the relation
+
+        A relation is a link unless it is implied by a longer path, ie. it
+        lies in the closed row of one of the children. For dense relations
+        see _link_sweep."""
+        A = self.to_sparse()
+        if A.nnz > DENSE_DEGREE * self.N:
+            return self._link_sweep(A)[1]
+        C = self.closure()
+        R = self.copy()
+        block = _block_rows(self.N)
+        for start in range(0, self.N, block):
+            nodes = np.arange(start, min(start + block, self.N))
+            R.bits[nodes] &= ~_union_of_children(C.bits, A, nodes)
+        return R
+
+    def _link_sweep(self, A):
+        """ Return the transitive closure and reduction of the relation
+
+        A is the relation as a scipy.sparse CSR matrix. Rows and columns are
+        put in topological order, and rows closed from the latest. The
+        earliest child of an element not yet reached is always a link, so
+        its closed row is added and the search repeated, which visits only
+        the links of each element rather than all its children."""
+        N = self.N
+        order = dag.topological_order(A)
+        position = np.argsort(order)
+        P = self._permuted(order, position)
+        rows, cols = [], []
+        for a in range(N - 1, -1, -1):
+            row = P.bits[a]
+            remaining = row.copy()
+            links = []
+            # all later words are zero before the first word with a set bit,
+            # and descendants of a link lie after it, so w only increases
+            w = 0
+            while True:
+                words = np.flatnonzero(remaining[w:])
+                if len(words) == 0:
+                    break
+                w += words[0]
+                byte, bit = _first_bit(int(remaining[w]))
+                p = 64 * w + 8 * byte + bit
+                links.append(p)
+                row[w:] |= P.bits[p, w:]
+                remaining[w:] &= ~P.bits[p, w:]
+                remaining[w] &= ~_word_bit(byte, bit)
+            rows.extend([a] * len(links))
+            cols.extend(links)
+        C = P._permuted(position, order)
+        rows = order[np.array(rows, dtype=int)]
+        cols = order[np.array(cols, dtype=int)]
+        links = sp.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)),
+                              shape=(N, N))
+        return C, CausalMatrix.from_sparse(links)
+
+    def _permuted(self, order, position):
+        """ Return the relation with element order[i] moved to i, where
+        position is the inverse permutation of order"""
+        bits = np.zeros(self.bits.shape, dtype=np.uint64)
+        block = _block_rows(self.N)
+        for start in range(0, self.N, block):
+            rows = unpack_rows(self.bits[order[start:start + block]], self.N)
+            bits[start:start + block] = pack_rows(rows[:, order])
+        return CausalMatrix(bits, self.N)
+
+
+def _first_bit(word):
+    """ Byte and bit of the first set element of a nonzero 64 bit word"""
+    if LITTLE_ENDIAN:
+        # the first byte in memory is the least significant
+        byte = ((word & -word).bit_length() - 1) // 8
+    else:
+        byte = 7 - (word.bit_length() - 1) // 8
+    return byte, FIRST_BIT_TABLE[(word >> (8 * _shift(byte))) & 255]
+
+
+def _word_bit(byte, bit):
+    """ 64 bit word with only the given element set"""
+    return np.uint64(1 << (8 * _shift(byte) + 7 - bit))
+
+
+def _shift(byte):
+    """ Significance of the byte at a position in memory within a word"""
+    return byte if LITTLE_ENDIAN else 7 - byte
+
+
+def _block_rows(N):
+    """ Number of rows of N bytes fitting in BLOCK_MEMORY"""
+    return int(max(1, dag.utils.BLOCK_MEMORY // max(N, 1)))
+
+
+def _union_of_children(bits, A, nodes):
+    """ Union of the rows of bits over the children in A of each node
+
+    A is a scipy.sparse CSR adjacency matrix. Returns an array with a row
+    of words for each node, zero for nodes without children."""
+    union = np.zeros((len(nodes), bits.shape[1]), dtype=np.uint64)
+    chunk = max(1, dag.utils.BLOCK_MEMORY // (8 * bits.shape[1]))
+    for group, children, offsets in dag.child_groups(A[nodes], chunk):
+        union[group] = np.bitwise_or.reduceat(bits[children], offsets,
+                                              axis=0)
+    return union
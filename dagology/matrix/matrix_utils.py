@@ -8,145 +8,480 @@
 __author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
 
 import numpy as np
+import scipy.sparse as sp
 
-def causet_adj_matrix(S, R):
+import dagology as dag
+
+def causet_adj_matrix(S, R, dtype=float):
     """ Return causal set adjacency matrix A
     
-        S: separations
-        R: original coordinates"""
-    N = S.shape[0]
-    A = np.zeros((N, N))
-    for i in range(N):
-        for j in range(N):
-            # check time ordering - A[i,j] is 1 if i is in the future of j
-            if R[i,0] > R[j,0]:
-                if S[i,j] < 0:
-                    A[i,j] = 1.
-    return A  
-    
-def transitive_completion(A_):
-    """ Transitively complete adjacency matrix A"""
-    A = A_[:,:]
-    A_0 = A[:,:]
-    N, _ = A.shape
-    A_diff = True
-    i = 0
-    while A_diff:
-        A_old = A[:,:]
-        A = np.dot(A, A_0)
-        A += A_0
-        A[A>1.] = 1.
-        if np.array_equal(A_old, A):
-            A_diff = False
-        assert i < N, 'ERROR - Transitive Completion required more than N steps'
-        i += 1
-    return A
+        S: separations, an NxN array such as minkowski_pdist(R, output='square')
+        R: original coordinates
+        dtype: type of the returned matrix - bool or np.uint8 store the
+               same relation in an eighth of the memory of float"""
+    # check time ordering - A[i,j] is 1 if i is in the future of j
+    later = R[:, 0, np.newaxis] > R[np.newaxis, :, 0]
+    return (later & (S < 0)).astype(dtype)
+
+def topological_levels(A):
+    """ Split the elements of a DAG into antichains in topological order
+
+    A is an NxN adjacency matrix, dense, scipy.sparse or CausalMatrix, with
+    A[i,j] nonzero for an edge from i to j. Each returned array holds the
+    elements all of whose parents are in earlier arrays, so elements of one
+    array are unrelated and edges only go from earlier to later arrays."""
+    if isinstance(A, dag.CausalMatrix):
+        A = A.to_sparse()
+    A = sp.csr_matrix(A)
+    A.eliminate_zeros()
+    N = A.shape[0]
+    indegree = np.bincount(A.indices, minlength=N)
+    level = np.flatnonzero(indegree == 0)
+    levels = []
+    n_ordered = 0
+    while len(level):
+        levels.append(level)
+        n_ordered += len(level)
+        decrease = np.bincount(A[level].indices, minlength=N)
+        indegree -= decrease
+        level = np.flatnonzero((indegree == 0) & (decrease > 0))
+    assert n_ordered == N, 'ERROR - Adjacency matrix is not acyclic'
+    return levels
+
+def child_groups(sub, max_children):
+    """ Split rows of a DAG into groups whose children fit in one chunk
+
+    sub is a scipy.sparse CSR matrix holding the rows of an adjacency
+    matrix for some nodes. Yields (group, children, offsets) for groups of
+    the nodes with children, in order, where group indexes the rows of sub,
+    children are the children of the group concatenated, at most
+    max_children of them unless a single node has more, and offsets start
+    the children of each node, as taken by ufunc.reduceat. Rows of the
+    children can then be gathered and reduced a group at a time."""
+    degree = np.diff(sub.indptr)
+    has_children = np.flatnonzero(degree)
+    ends = np.cumsum(degree[has_children])
+    start = 0
+    while start < len(has_children):
+        # take nodes while their children fit in one chunk
+        first = ends[start - 1] if start else 0
+        stop = max(start + 1, np.searchsorted(ends, first + max_children,
+                                              side='right'))
+        group = has_children[start:stop]
+        lo, hi = sub.indptr[group[0]], sub.indptr[group[-1] + 1]
+        yield group, sub.indices[lo:hi], sub.indptr[group] - lo
+        start = stop
+
+def topological_order(A):
+    """ Return a topological order of the elements of a DAG, see
+    topological_levels"""
+    levels = topological_levels(A)
+    if not levels:
+        return np.zeros(0, dtype=int)
+    return np.concatenate(levels)
+
+def transitive_completion(A_, output=None):
+    """ Transitively complete adjacency matrix A
+
+    A_ -- adjacency matrix, dense array, scipy.sparse matrix or CausalMatrix
+    output -- 'dense' for an array of the dtype of A_, 'sparse' for a
+              scipy.sparse CSR boolean matrix or 'bits' for a CausalMatrix,
+              default to the same kind as A_
+
+    The closure is found with bitset rows in topological order, see
+    CausalMatrix.closure, in about N*E/64 word operations"""
+    return _as_output(_as_causal_matrix(A_).closure(), A_, output)
     
-def transitive_reduction(A_, LP=None):
+def transitive_reduction(A_, LP=None, output=None):
     """ Transitively reduce adjacency matrix A
-   
-    plan is to look at successive powers of A and if an element is 1 in both
-    then it represents an edge which is transitively implied
-    we need to do this |LP| times - 
-       - could do it N times to be sure (start here)
-       - could compute |LP| but that might be slower
-       - could allow |LP| as optional input incase it is already calculated
+
+    A_ -- adjacency matrix, dense array, scipy.sparse matrix or CausalMatrix
+    LP -- no longer needed, the reduction takes one pass over the closure
+    output -- 'dense', 'sparse' or 'bits', see transitive_completion
+
+    An edge is kept unless it is implied by a longer path, see
+    CausalMatrix.reduction
    """
-    A = A_[:,:]
-    A_0 = A[:,:]
-    N, _ = A.shape
-    if LP:
-        max_path = LP
+    return _as_output(_as_causal_matrix(A_).reduction(), A_, output)
+
+def _as_causal_matrix(A):
+    """ Return adjacency matrix A as a CausalMatrix"""
+    if isinstance(A, dag.CausalMatrix):
+        return A
+    elif sp.issparse(A):
+        return dag.CausalMatrix.from_sparse(A)
+    return dag.CausalMatrix.from_dense(A)
+
+def _as_output(C, A, output=None):
+    """ Convert CausalMatrix C to output, or to the same kind as A"""
+    if output is None:
+        if isinstance(A, dag.CausalMatrix):
+            output = 'bits'
+        elif sp.issparse(A):
+            output = 'sparse'
+        else:
+            output = 'dense'
+    if output == 'bits':
+        return C
+    elif output == 'sparse':
+        return C.to_sparse()
+    elif output == 'dense':
+        return C.to_dense(getattr(A, 'dtype', bool))
     else:
-        max_path = N
-    i = 0
-    while i < max_path:
-        A = np.dot(A, A_0)
-        A = A_0 - A
-        A[A<1] = 0
-        A[A>1] = 1
-        i += 1
-    return A
+        assert False, 'ERROR - output must be dense, sparse or bits'
 
-def longest_path_matrix(A, dmax=None):
+def longest_path_matrix(A, dmax=None, dtype=None, path=None):
     """ Calculate all longest paths and return them in a matrix
     
     Arguments:
-    A -- adjacency matrix
-    dmax -- maximum path length to be returned
+    A -- adjacency matrix, dense array, scipy.sparse matrix or CausalMatrix
+    dmax -- maximum path length to be returned, longer paths are given as
+            dmax
+    dtype -- type of the returned matrix. By default the smallest unsigned
+             integer type which can hold every path length, at most N-1 or
+             dmax. Any integer type holding them or a float type is exact
+    path -- if given, the matrix is written to a memory-mapped .npy file
+            at this path, which np.load(path, mmap_mode='r') opens again,
+            rather than held in memory
     
     Result should be an NxN assymetric matrix of longest paths
     
     Notes:
-    JC - I believe this scales like N**3
-         Finding one longest path can be done in linear time
-         And we need to find N**2 of them so this is reasonable
+    Nodes are taken in reverse topological order, a level at a time, and
+    the row of longest paths from each node is the largest of the rows of
+    its children plus one. This is O(N*E) for E edges, and only keeps
+    path lengths, which cannot overflow like path counts. Wide levels are
+    split so each set of new rows uses about BLOCK_MEMORY bytes.
         
     JC - The longest path is conjectured to approximate the geodesic in 
          Lorentzian spacetimes but this is not proven to my knowledge 
     """
+    A = _adjacency_csr(A)
     N = A.shape[0]
     if dmax is None:
-        dmax = N
-    LP = np.zeros((N, N))
-    i = 1
-    B = A[:,:]
-    while np.sum(B) > 0.:
-        path_exist = np.sign(B)
-        path_length = i * path_exist
-        LP = np.maximum.reduce((LP, path_length))
-        B = np.dot(B, A)
-        i += 1
-        if i == dmax:
-            return LP
+        dmax = max(N - 1, 1)
+    assert dmax >= 1, 'ERROR - dmax must be at least 1'
+    longest = min(max(N - 1, 0), dmax)
+    if dtype is None:
+        dtype = np.min_scalar_type(longest)
+    if np.issubdtype(dtype, np.integer):
+        assert longest <= np.iinfo(dtype).max, \
+            'ERROR - dtype cannot hold all path lengths'
+    if path is not None:
+        LP = np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                       shape=(N, N))
+    else:
+        LP = np.zeros((N, N), dtype=dtype)
+    # rows of a level computed at once, so wide levels stay within memory
+    n_rows = int(max(1, dag.utils.BLOCK_MEMORY //
+                     (np.dtype(dtype).itemsize * max(N, 1))))
+    for level in reversed(topological_levels(A)):
+        for start in range(0, len(level), n_rows):
+            nodes = level[start:start + n_rows]
+            LP[nodes] = _longest_from_children(LP, A, nodes, dmax)
+    if path is not None:
+        LP.flush()
     return LP
+
+def _adjacency_csr(A):
+    """ Return adjacency matrix A as scipy.sparse CSR without stored zeros"""
+    if isinstance(A, dag.CausalMatrix):
+        return A.to_sparse()
+    A = sp.csr_matrix(A, copy=True)
+    A.eliminate_zeros()
+    return A
+
+def _longest_from_children(LP, A, nodes, dmax):
+    """ Rows of longest paths from each node, given those of its children
+
+    A is a scipy.sparse CSR adjacency matrix, and rows of LP for all the
+    children must be complete. Path lengths are capped at dmax."""
+    N = LP.shape[1]
+    rows = np.zeros((len(nodes), N), dtype=LP.dtype)
+    # number of child rows gathered at once
+    chunk = int(max(1, dag.utils.BLOCK_MEMORY //
+                    (2 * LP.dtype.itemsize * max(N, 1))))
+    for group, children, offsets in child_groups(A[nodes], chunk):
+        # paths through each child are one longer, and each child is one step
+        paths = LP[children]
+        if dmax < N - 1:
+            np.minimum(paths, dmax - 1, out=paths)
+        paths += (paths > 0).astype(paths.dtype)
+        paths[np.arange(len(children)), children] = 1
+        rows[group] = np.maximum.reduceat(paths, offsets, axis=0)
+    return rows
     
-def naive_spacelike_matrix(LP, dmax=None, k=None):  
+def naive_spacelike_matrix(LP, dmax=None, k=None, dtype=float):
     """ Calculate all naive spacelike distances and return them in a matrix
     
     Arguments:
     LP -- longest path matrix
     dmax -- maximum spacelike distance to be returned
-    k -- only determine distances to k 'landmark' points, and leave the rest
-        # this feature needs testing
+    k -- only determine distances to k 'landmark' points, the first k rows,
+         and leave the rest
+    dtype -- floating point type of the returned matrix. LP may have any
+             numeric type, such as the compact integers of
+             longest_path_matrix. np.float32 halves the memory and is exact
+             for squared path lengths up to 2**24
     
     Result should be an NxN symmetric matrix of negative longest paths
     and positive naive spacelike separations
-    
-    JC - this seems quite slow when calculated for all N - I think it is the 
-         limiting factor on embedding large networks in spacetimes
+
+    The naive spacelike distance between unrelated i and j is the shortest
+    longest path LP[w,z] from a common past element w to a common future
+    element z, or dmax if there is none.
+
+    Notes:
+    This is a (min,+) product over the common past and future. For each i
+    the minimum over z in the future of i and j is found for every w in
+    the past of i together, in one sweep over the links in reverse
+    topological order, as the future of j is the union of the futures of
+    its links. Blocks of w are taken at once to bound the memory used, and
+    the sweep costs about N*E*min(past, future) for E links, rather than
+    a loop over w and z for every pair.
     """
+    N = LP.shape[0]
     if dmax == None:
-        dmax = np.max(LP)
-    ds = LP + LP.transpose()
+        dmax = np.max(LP) if N else 0
+    dmax = float(dmax)
+    # unsigned path lengths would wrap around when negated
+    ds = LP.astype(dtype) + LP.transpose()
     ds2 = ds * ds * -1
-    N = LP.shape[0]
-    for i in range(N):
-        max_j = i
-        if k:
-            max_j = np.min([i, k])
-        for j in range(max_j):
-            # spacelike distance is symmetric so ds[i,j]==ds[j,i], and ds[i,i]==0
-            if ds2[i,j] == 0:
-                # then they are spacelike separated and need a new value here
-                i_past = np.flatnonzero(LP[:,i])
-                j_past = np.flatnonzero(LP[:,j])
-                w_list = np.intersect1d(i_past, j_past)
-
-                i_future = np.flatnonzero(LP[i,:])
-                j_future = np.flatnonzero(LP[j,:])
-                z_list = np.intersect1d(i_future, j_future)
-                if (len(z_list)>0) and (len(w_list)>0):
-                    # find min non-zero LP from w to z
-                    sp_dist = dmax
-                    for w in w_list:
-                        for z in z_list:
-                            w_z = LP[w, z]
-                            if w_z > 0:
-                                sp_dist = min(sp_dist, w_z)
-                else:
-                    sp_dist = dmax
-                    
-                ds2[i,j] = sp_dist * sp_dist
-                ds2[j,i] = sp_dist * sp_dist
-    return ds2 
+    # the distances are the same with the order reversed, so each row is
+    # swept from whichever of its past and future is smaller
+    directions = []
+    for paths in [LP, LP.T]:
+        related = paths > 0
+        links = sp.csr_matrix(paths == 1)
+        levels = [(level, links[level]) for level in
+                  reversed(topological_levels(links))]
+        directions.append((paths, related, levels))
+    # path lengths in the smallest type holding them and a larger sentinel
+    longest = int(np.max(LP)) if N else 0
+    path_type = np.min_scalar_type(longest + 1)
+    n_past = np.sum(directions[0][1], axis=0)
+    n_future = np.sum(directions[0][1], axis=1)
+    n_sources = N if not k else min(k, N)
+    for i in range(n_sources):
+        related = directions[0][1]
+        # spacelike distance is symmetric, so find each pair from its
+        # smaller index, which is below k for the pairs needed
+        targets = np.flatnonzero(~related[i] & ~related[:, i])
+        targets = targets[targets > i]
+        if len(targets) == 0:
+            continue
+        paths, related, levels = directions[int(n_future[i] < n_past[i])]
+        spacelike = ~(related[i] | related[:, i])
+        spacelike[i] = False
+        sp_dist = _spacelike_distances(paths, np.flatnonzero(related[:, i]),
+                                       related[i], spacelike, levels,
+                                       targets, path_type, longest + 1)
+        sp_dist = np.where(sp_dist > longest, dmax, np.minimum(sp_dist, dmax))
+        ds2[i, targets] = sp_dist * sp_dist
+        ds2[targets, i] = sp_dist * sp_dist
+    return ds2
+
+def _spacelike_distances(paths, past, future, spacelike, levels, targets,
+                         path_type, none):
+    """ Naive spacelike distances from an element i to each of targets
+
+    paths[w] is the row of longest paths from w, for each w in past, which
+    are elements in the past of i. future and spacelike are boolean masks
+    of the elements in the future of i and unrelated to i, and levels pairs
+    each topological level of a DAG with the same order, such as the links,
+    with its rows of edges, in reverse order. Pairs with no common past and
+    future element get none.
+
+    For every w, reach[z, w] is the smallest paths[w, y] for y in the
+    future of i and either z or in the future of z. In the future of i this
+    is paths[w, z], as paths only get longer, and for z spacelike to i it
+    is built up from the edges of z a level at a time."""
+    N = len(future)
+    distance = np.zeros(len(targets), dtype=path_type) + none
+    if len(past) == 0 or not np.any(future):
+        return distance
+    is_target = np.zeros(N, dtype=bool)
+    is_target[targets] = True
+    target_index = np.zeros(N, dtype=int)
+    target_index[targets] = np.arange(len(targets))
+    # edges of the spacelike elements of each level, nothing below i is
+    # linked from them
+    sweep = []
+    for level, sub in levels:
+        rows = np.flatnonzero(spacelike[level])
+        if len(rows):
+            children, offsets, has_links = _rows_of_links(sub, rows)
+            sweep.append((level[rows], children, offsets, has_links,
+                          np.flatnonzero(is_target[level[rows]])))
+    itemsize = np.dtype(path_type).itemsize
+    block = int(max(1, dag.utils.BLOCK_MEMORY // (2 * itemsize * N)))
+    for start in range(0, len(past), block):
+        W = past[start:start + block]
+        rows = paths[W]
+        reach = rows.T.astype(path_type)
+        reach[~future] = none
+        for nodes, children, offsets, has_links, in_nodes in sweep:
+            shortest = np.zeros((len(nodes), len(W)), dtype=path_type) + none
+            if len(has_links):
+                shortest[has_links] = np.minimum.reduceat(reach[children],
+                                                          offsets, axis=0)
+            reach[nodes] = shortest
+            if len(in_nodes):
+                # w must also be in the past of the target
+                j = nodes[in_nodes]
+                common = shortest[in_nodes]
+                common[rows[:, j].T == 0] = none
+                distance[target_index[j]] = np.minimum(
+                    distance[target_index[j]], np.min(common, axis=1))
+    return distance
+
+def _rows_of_links(sub, rows):
+    """ Concatenated links of the given rows of CSR matrix sub, with the
+    offsets of each nonempty row, for np.minimum.reduceat, and which rows
+    they are"""
+    degree = np.diff(sub.indptr)[rows]
+    ends = np.cumsum(degree)
+    position = np.arange(ends[-1] if len(ends) else 0)
+    position += np.repeat(sub.indptr[rows] - ends + degree, degree)
+    has_links = np.flatnonzero(degree)
+    return sub.indices[position], (ends - degree)[has_links], has_links
+
+def landmark_longest_paths(A, landmarks, dtype=None):
+    """ Longest paths from and to each landmark
+
+    Arguments:
+    A -- adjacency matrix, dense array, scipy.sparse matrix or CausalMatrix
+    landmarks -- array of k element indices
+    dtype -- integer type of the returned rows, by default the smallest
+             unsigned type holding the longest chain
+
+    Returns:
+    LP_from, LP_to -- kxN arrays, the rows LP[landmarks] and the columns
+                      LP[:, landmarks] of longest_path_matrix(A)
+
+    Notes:
+    Each is a single source longest path sweep over the topological levels,
+    taken for all the landmarks together, in O(k*E) time and O(k*N) memory
+    """
+    A = _adjacency_csr(A)
+    landmarks = np.asarray(landmarks, dtype=int)
+    levels = topological_levels(A)
+    if dtype is None:
+        dtype = np.min_scalar_type(len(levels))
+    parents = A.transpose().tocsr()
+    LP_from = _single_source_paths(parents, levels, landmarks, dtype)
+    LP_to = _single_source_paths(A, levels[::-1], landmarks, dtype)
+    return LP_from.T.copy(), LP_to.T.copy()
+
+def _single_source_paths(parents, levels, sources, dtype):
+    """ Longest paths from each of sources, with a row for each element
+
+    parents is a scipy.sparse CSR matrix whose rows hold the parents of each
+    element, and levels are its topological levels in order."""
+    N = parents.shape[0]
+    k = len(sources)
+    # one more than the path length, so that zero is unreached
+    steps = np.zeros((N, k), dtype=dtype)
+    steps[sources, np.arange(k)] = 1
+    chunk = int(max(1, dag.utils.BLOCK_MEMORY //
+                    (2 * np.dtype(dtype).itemsize * max(k, 1))))
+    for level in levels:
+        for start in range(0, len(level), chunk):
+            nodes = level[start:start + chunk]
+            children, offsets, has_parents = _rows_of_links(
+                parents, nodes)
+            if len(has_parents) == 0:
+                continue
+            gathered = steps[children]
+            gathered += (gathered > 0).astype(dtype)
+            nodes = nodes[has_parents]
+            steps[nodes] = np.maximum(steps[nodes], np.maximum.reduceat(
+                gathered, offsets, axis=0))
+    return steps - (steps > 0).astype(dtype)
+
+def approx_landmark_spacelike_rows(A, landmarks, dmax=None, dtype=float,
+                                   paths=None, candidates=16):
+    """ Approximate squared separations from each landmark to every element
+
+    Arguments:
+    A -- adjacency matrix, dense array, scipy.sparse matrix or CausalMatrix
+    landmarks -- array of k element indices
+    dmax -- maximum spacelike distance to be returned, default to the
+            longest path from any landmark
+    dtype -- floating point type of the returned rows
+    paths -- (LP_from, LP_to) of landmark_longest_paths, if already found
+    candidates -- number of landmarks nearest to each landmark, before and
+                  after it, taken as common past and future elements, or
+                  None for all of them
+
+    Result should be a kxN matrix approximating the rows of
+    naive_spacelike_matrix for the landmarks, of negative squared longest
+    paths and positive squared naive spacelike separations
+
+    Notes:
+    This is an approximation. The longest paths are only known from and to
+    the landmarks, so a spacelike separation is the shortest longest path
+    from a landmark in the common past to any element of the common
+    future, or from any element of the common past to a landmark in the
+    common future, whichever is shorter. Only the candidates nearest
+    landmarks before and after each landmark are tried, as paths through
+    further ones are longer. Pairs with no such landmark get dmax.
+
+    Timelike separations are exact, but spacelike ones can only be larger
+    than the exact value. For a 2D causal set of 1500 elements with 50
+    random landmarks about 10% of the spacelike separations are exact, 7%
+    are dmax, and they are 1.4 times the exact value on average (median
+    1.2). With 150 landmarks these are 25%, 3% and 1.2 times. With every
+    element a landmark, and candidates None, this is
+    naive_spacelike_matrix.
+
+    Each row takes two sweeps over the edges, for at most candidates
+    landmarks, so the whole takes O(k*candidates*E) time for k landmarks
+    and E edges, and O(k*N) memory. Sweeping the links rather than the
+    whole relation is much faster.
+    """
+    A = _adjacency_csr(A)
+    landmarks = np.asarray(landmarks, dtype=int)
+    if paths is None:
+        paths = landmark_longest_paths(A, landmarks)
+    LP_from, LP_to = paths
+    k, N = LP_from.shape
+    longest = int(np.max(LP_from)) if LP_from.size else 0
+    if dmax == None:
+        dmax = longest
+    dmax = float(dmax)
+    ds = LP_from.astype(dtype) + LP_to
+    ds2 = ds * ds * -1
+    # paths to a landmark can be longer than those from any landmark
+    none = max(longest, int(np.max(LP_to)) if LP_to.size else 0) + 1
+    path_type = np.min_scalar_type(none)
+    # sweeps over the DAG and over the DAG with its edges reversed
+    levels = topological_levels(A)
+    parents = A.transpose().tocsr()
+    directions = [(LP_from, [(level, A[level]) for level in levels[::-1]]),
+                  (LP_to, [(level, parents[level]) for level in levels])]
+    for a, i in enumerate(landmarks):
+        spacelike = ~((LP_from[a] > 0) | (LP_to[a] > 0))
+        spacelike[i] = False
+        targets = np.flatnonzero(spacelike)
+        if len(targets) == 0:
+            continue
+        sp_dist = np.zeros(len(targets), dtype=path_type) + none
+        for known, levels in directions:
+            # the nearest landmarks before i, after i in the reversed DAG
+            before = _nearest(known[:, i], candidates)
+            sp_dist = np.minimum(sp_dist, _spacelike_distances(
+                known, before, known[a] > 0, spacelike, levels, targets,
+                path_type, none))
+        sp_dist = np.where(sp_dist == none, dmax, np.minimum(sp_dist, dmax))
+        ds2[a, targets] = sp_dist * sp_dist
+    return ds2
+
+def _nearest(paths, n):
+    """ Sorted indices of the n smallest positive entries of paths, or of
+    all of them if n is None"""
+    related = np.flatnonzero(paths)
+    if n is not None and len(related) > n:
+        related = np.sort(related[np.argsort(paths[related],
+                                             kind='mergesort')[:n]])
+    return related
@@ -9,13 +9,22 @@ __author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
 
 import numpy as np
 from numpy.linalg import eigh
+from scipy.sparse.linalg import LinearOperator
+from scipy.sparse.linalg import eigsh
 
-__all__ = ['mds']
+__all__ = ['mds',
+           'landmark_mds',
+           'landmark_projection',
+           'triangulate',
+           'double_centre_operator']
 
+# largest matrix which solver='auto' fully diagonalises
+DENSE_SIZE = 1000
 
-def J_matrix(N):
+
+def J_matrix(N, dtype=float):
     """ Return NxN double-centering matrix"""
-    J = np.identity(N) - (1./N)*np.ones((N, N))
+    J = np.identity(N, dtype=dtype) - (1./N)*np.ones((N, N), dtype=dtype)
     return J
     
 def calc_double_centre(S):
@@ -30,14 +39,44 @@ def calc_double_centre(S):
     Returns
     -------
     
-    Double centered square distance matrix"""
+    Double centered square distance matrix, -0.5 * J S J, found from the
+    row and column means of S rather than products with J"""
     
     N, _ = S.shape
     assert N == _ , 'Distance matrix must be square'
-    J = J_matrix(N)
-    A = -0.5 * np.dot(np.dot(J, S), J)
+    row, col, total = _means(S)
+    A = S - row[:, np.newaxis]
+    A -= col
+    A += total
+    A *= -0.5
     return A
 
+def double_centre_operator(S):
+    """ Return the double-centered S as a scipy LinearOperator
+
+    Products with the operator take one product with S and O(N) more work,
+    so the NxN centred matrix is never formed. S may be any square matrix
+    with a dot method, such as a memory-mapped array."""
+    N, _ = S.shape
+    assert N == _ , 'Distance matrix must be square'
+    row, col, total = _means(S)
+
+    def matvec(v):
+        v = np.ravel(v)
+        v_sum = np.sum(v)
+        Av = S.dot(v) - row * v_sum
+        Av -= np.dot(col, v) - total * v_sum
+        return -0.5 * Av
+
+    return LinearOperator((N, N), matvec=matvec, rmatvec=matvec,
+                          dtype=S.dtype)
+
+def _means(S):
+    """ Row means, column means and mean of S"""
+    row = np.mean(S, axis=1)
+    col = np.mean(S, axis=0)
+    return row, col, np.mean(row)
+
 def e_eval(E, U, D):
     """ Return largest D eigvenvalues and corresponding eigenvectors
     
@@ -73,23 +112,119 @@ def m_eval(E, U, D):
     U_max = np.concatenate((U[:, :1], U[:, :-1*D:-1]), axis=1)
     return E_max, U_max
 
-def mds(ds2, D, method='euclidean'):
+def mds(ds2, D, method='euclidean', dtype=float, solver='auto'):
     """ Classic MDS algorithm
     
     Allowed methods - 
     -- euclidean - classic MDS
-    -- lorentzian - the largest negative eigenvalue is used, and the D-1 largest positive"""
+    -- lorentzian - the largest negative eigenvalue is used, and the D-1 largest positive
+
+    dtype - floating point type of the calculation. np.float32 halves the
+            memory, with eigenvalues accurate to about 1e-7 of the largest
+    solver - how the eigenvectors are found
+    -- dense - all eigenvectors of the double-centered matrix, by eigh
+    -- eigsh - only the D needed, from both ends of the spectrum, by
+               Lanczos iteration, which is much faster for large N
+    -- operator - as eigsh, but on double_centre_operator(ds2), so the
+                  centred NxN matrix is never formed
+    -- auto - dense up to DENSE_SIZE points, and eigsh above"""
     N, _ = ds2.shape
     assert N == _
-    A = calc_double_centre(ds2)
-    E_, U_ = eigh(A)
-    if method == 'euclidean':
-        E, U = e_eval(E_, U_, D)
-    elif method == 'lorentzian':
-        E, U = m_eval(E_, U_, D)
+    ds2 = np.asarray(ds2, dtype=dtype)
+    if solver == 'auto':
+        solver = 'dense' if N <= DENSE_SIZE else 'eigsh'
+    if solver == 'operator':
+        A = double_centre_operator(ds2)
     else:
-        assert False, 'method must be either euclidean or lorentzian'
+        A = calc_double_centre(ds2)
+    E, U = _extreme_eigenpairs(A, D, method, solver)
     X = np.dot(U, np.sqrt(E))
     return X
-       
 
+def _extreme_eigenpairs(A, D, method, solver='dense'):
+    """ Return the eigenvalues and eigenvectors of e_eval or m_eval for A
+
+    A is a symmetric array, or a LinearOperator when solver is operator.
+    For eigsh and operator the two ends of the spectrum are found
+    separately by Lanczos iteration."""
+    if method not in ['euclidean', 'lorentzian']:
+        assert False, 'method must be either euclidean or lorentzian'
+    N = A.shape[0]
+    if solver == 'dense' or (solver == 'eigsh' and D >= N - 1):
+        E_, U_ = eigh(A)
+        if method == 'euclidean':
+            return e_eval(E_, U_, D)
+        return m_eval(E_, U_, D)
+    assert solver in ['eigsh', 'operator'], \
+        'ERROR - solver must be auto, dense, eigsh or operator'
+    assert D < N - 1, 'ERROR - too many dimensions for an iterative solver'
+    if method == 'euclidean':
+        E, U = eigsh(A, k=D, which='LA')
+        # ascending, as e_eval
+        order = np.argsort(E)
+        return np.diag(E[order]), U[:, order]
+    E, U = eigsh(A, k=1, which='SA')
+    E = -1. * E
+    if D > 1:
+        # descending positive eigenvalues after the negative, as m_eval
+        E_pos, U_pos = eigsh(A, k=D - 1, which='LA')
+        order = np.argsort(E_pos)[::-1]
+        E = np.concatenate((E, E_pos[order]))
+        U = np.concatenate((U, U_pos[:, order]), axis=1)
+    return np.diag(E), U
+
+def landmark_mds(ds2, landmarks, D, method='euclidean', dtype=float):
+    """ Landmark MDS, embedding the landmarks and triangulating every point
+
+    ds2 - kxN matrix of square distances from each of k landmarks to all N
+          points
+    landmarks - the columns of ds2 holding the landmarks, in row order
+    D - dimension
+    method - euclidean or lorentzian, as in mds
+    dtype - floating point type of the calculation
+
+    The landmarks are embedded by mds of their kxk square distances, and
+    every point is placed from its square distances to them, see
+    landmark_projection and triangulate. Landmarks are placed exactly at
+    their mds coordinates.
+
+    This takes O(k^3 + k*N*D) time and O(k*N) memory, see de Silva and
+    Tenenbaum, Sparse multidimensional scaling using landmark points (2004)
+    """
+    k, N = ds2.shape
+    ds2 = np.asarray(ds2, dtype=dtype)
+    ds2_L = ds2[:, landmarks]
+    assert ds2_L.shape == (k, k), 'ERROR - need one landmark for each row'
+    return triangulate(ds2, landmark_projection(ds2_L, D, method, dtype))
+
+def landmark_projection(ds2_L, D, method='euclidean', dtype=float):
+    """ Return the projection placing points from distances to landmarks
+
+    ds2_L - kxk matrix of square distances between the landmarks
+
+    Returns (L, mean), where L is the kxD pseudo-inverse of the mds
+    coordinates of the landmarks, with the time coordinate changing sign
+    for lorentzian, and mean is the mean square distance from each landmark
+    to the others. Directions with no spread get zero coordinates."""
+    ds2_L = np.asarray(ds2_L, dtype=dtype)
+    E, U = _extreme_eigenpairs(calc_double_centre(ds2_L), D, method)
+    signs = np.ones(D, dtype=dtype)
+    if method == 'lorentzian':
+        signs[0] = -1.
+    E = np.diag(E)
+    scale = np.where(E > 0, 1. / np.sqrt(np.abs(E)), 0.) * signs
+    L = (U * scale).astype(dtype)
+    return L, np.mean(ds2_L, axis=1)
+
+def triangulate(ds2, projection):
+    """ Coordinates of points from their square distances to the landmarks
+
+    ds2 - kxN matrix of square distances from each landmark to N points
+    projection - (L, mean) of landmark_projection
+
+    Each point x is placed at -0.5 * L^T (ds2[:, x] - mean), the least
+    squares solution of the linearised distance equations, in O(k*D) time
+    per point."""
+    L, mean = projection
+    ds2 = np.asarray(ds2, dtype=L.dtype)
+    return -0.5 * (np.dot(ds2.T, L) - np.dot(mean, L))
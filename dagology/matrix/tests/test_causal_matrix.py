@@ -0,0 +1,101 @@
+from nose.tools import assert_equal
+from nose.tools import assert_raises
+from nose.tools import assert_true
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+import dagology as dag
+
+def random_relation(N, D=2, seed=0):
+    """ Closed relation of a cube space causal set, and its links"""
+    R = np.random.RandomState(seed).uniform(size=(N, D))
+    closed = dag.cube_space_relation(R).toarray()
+    links = dag.cube_space_relation(R, hasse=True).toarray()
+    return closed, links
+
+class TestCausalMatrix(object):
+    """ Unit tests for CausalMatrix"""
+
+    def test_round_trip(self):
+        for N in [0, 1, 7, 64, 65, 130]:
+            A = np.random.RandomState(N).uniform(size=(N, N)) < 0.3
+            C = dag.CausalMatrix.from_dense(A)
+            assert_equal(C.bits.shape, (N, (N + 63) // 64))
+            assert_true(np.array_equal(C.to_dense(), A))
+            assert_true(np.array_equal(
+                dag.CausalMatrix.from_sparse(sp.csr_matrix(A)).to_dense(), A))
+            assert_true(np.array_equal(C.to_sparse().toarray(), A))
+            assert_true(np.array_equal(C.T.to_dense(), A.T))
+            assert_equal(C.number_of_relations(), A.sum())
+
+    def test_rows_and_columns(self):
+        A, _ = random_relation(100)
+        C = dag.CausalMatrix.from_dense(A)
+        for i in [0, 13, 64, 99]:
+            assert_true(np.array_equal(C.descendants(i), np.flatnonzero(A[i])))
+            assert_true(np.array_equal(C.ancestors(i),
+                                       np.flatnonzero(A[:, i])))
+            for j in [0, 5, 63, 64, 99]:
+                assert_equal(C.related(i, j), A[i, j])
+
+    def test_from_graph(self):
+        G = nx.path_graph(5, create_using=nx.DiGraph())
+        C = dag.CausalMatrix.from_graph(G)
+        assert_equal(C.number_of_relations(), 4)
+        assert_true(C.related(2, 3))
+
+    def test_closure_and_reduction(self):
+        closed, links = random_relation(150)
+        C = dag.CausalMatrix.from_dense(links).closure()
+        assert_true(np.array_equal(C.to_dense(), closed))
+        L = dag.CausalMatrix.from_dense(closed).reduction()
+        assert_true(np.array_equal(L.to_dense(), links))
+        # reducing the links changes nothing
+        L = dag.CausalMatrix.from_dense(links).reduction()
+        assert_true(np.array_equal(L.to_dense(), links))
+
+    def test_link_sweep(self):
+        for D in [2, 3]:
+            closed, links = random_relation(200, D, seed=D)
+            for A in [closed, links]:
+                C = dag.CausalMatrix.from_dense(A)
+                closure, reduction = C._link_sweep(C.to_sparse())
+                assert_true(np.array_equal(closure.to_dense(), closed))
+                assert_true(np.array_equal(reduction.to_dense(), links))
+
+    def test_path(self):
+        G = nx.path_graph(70, create_using=nx.DiGraph())
+        C = dag.transitive_completion(dag.CausalMatrix.from_graph(G))
+        assert_equal(C.number_of_relations(), 70 * 69 // 2)
+        assert_equal(C.ordering_fraction(), 1.)
+        assert_equal(C.interval_size(3, 50), 48)
+        assert_equal(C.interval_size(3, 50, transpose=C.T), 48)
+        assert_equal(C.interval_size(50, 3), 0)
+        assert_equal(C.interval_size(5, 5), 1)
+        L = dag.transitive_reduction(C)
+        assert_equal(L.number_of_relations(), 69)
+
+    def test_interval_size(self):
+        closed, _ = random_relation(80, D=3)
+        C = dag.CausalMatrix.from_dense(closed)
+        for a in range(0, 80, 7):
+            for b in range(0, 80, 5):
+                if a == b:
+                    expected = 1
+                elif closed[a, b]:
+                    expected = np.sum(closed[a] & closed[:, b]) + 2
+                else:
+                    expected = 0
+                assert_equal(C.interval_size(a, b), expected)
+
+    def test_cycle(self):
+        G = nx.cycle_graph(4, create_using=nx.DiGraph())
+        C = dag.CausalMatrix.from_graph(G)
+        assert_raises(AssertionError, C.closure)
+
+    def test_longest_path(self):
+        _, links = random_relation(60)
+        LP = dag.longest_path_matrix(links.astype(float))
+        LP_C = dag.longest_path_matrix(dag.CausalMatrix.from_dense(links))
+        assert_true(np.array_equal(LP, LP_C))
@@ -4,8 +4,13 @@ from nose.tools import assert_in
 from nose.tools import assert_raises
 from nose.tools import assert_true
 
+import os
+import shutil
+import tempfile
+
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
 import dagology as dag
 
 class TestLongestPathMatrix(object):
@@ -19,3 +24,264 @@ class TestLongestPathMatrix(object):
         for i in range(10):
             for j in range(10):
                 assert_equal(LP[i,j], max(j-i, 0))
+
+    def test_random_dag(self):
+        G = dag.cube_space_graph(80, 3, hasse=True, seed=2)
+        LP = dag.longest_path_matrix(nx.adjacency_matrix(G))
+        assert_equal(LP.dtype, np.uint8)
+        for i in range(0, 80, 7):
+            lengths = {}
+            for j in nx.topological_sort(G):
+                if j == i or j in lengths:
+                    for k in G.successors(j):
+                        lengths[k] = max(lengths.get(k, 0),
+                                         lengths.get(j, 0) + 1)
+            for j in range(80):
+                assert_equal(LP[i, j], lengths.get(j, 0))
+
+    def test_dmax(self):
+        G = nx.path_graph(10, create_using=nx.DiGraph())
+        LP = dag.longest_path_matrix(nx.adjacency_matrix(G), dmax=3)
+        for i in range(10):
+            for j in range(10):
+                assert_equal(LP[i,j], min(max(j-i, 0), 3))
+
+    def test_deep(self):
+        G = nx.path_graph(300, create_using=nx.DiGraph())
+        LP = dag.longest_path_matrix(nx.adjacency_matrix(G))
+        assert_equal(LP.dtype, np.uint16)
+        assert_equal(LP[0, 299], 299)
+        LP = dag.longest_path_matrix(dag.CausalMatrix.from_graph(G),
+                                     dtype=float)
+        assert_equal(LP[5, 299], 294.)
+
+    def test_split_levels(self):
+        # a memory budget of a few rows splits every level into pieces
+        G = dag.cube_space_graph(80, 3, hasse=True, seed=2)
+        expected = dag.longest_path_matrix(nx.adjacency_matrix(G))
+        memory = dag.utils.BLOCK_MEMORY
+        dag.utils.BLOCK_MEMORY = 3 * 80
+        try:
+            LP = dag.longest_path_matrix(nx.adjacency_matrix(G))
+        finally:
+            dag.utils.BLOCK_MEMORY = memory
+        assert_true(np.array_equal(LP, expected))
+
+    def test_memmap(self):
+        G = nx.path_graph(10, create_using=nx.DiGraph())
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'LP.npy')
+            LP = dag.longest_path_matrix(nx.adjacency_matrix(G), path=path)
+            assert_true(isinstance(LP, np.memmap))
+            LP_loaded = np.load(path, mmap_mode='r')
+            assert_equal(LP_loaded[2, 9], 7)
+            del LP, LP_loaded
+        finally:
+            shutil.rmtree(directory)
+
+class TestChildGroups(object):
+    """ Unit tests for grouping nodes by their number of children"""
+
+    def test_groups(self):
+        G = dag.cube_space_graph(60, 2, seed=9)
+        A = nx.adjacency_matrix(G, range(60))
+        sub = A[np.arange(0, 60, 2)]
+        for max_children in [1, 7, 50, 10000]:
+            seen = []
+            for group, children, offsets in dag.child_groups(sub,
+                                                             max_children):
+                assert_true(len(children) <= max_children or len(group) == 1)
+                ends = np.append(offsets[1:], len(children))
+                for i, lo, hi in zip(group, offsets, ends):
+                    assert_equal(list(children[lo:hi]),
+                                 list(sub[i].indices))
+                seen.extend(group)
+            degree = np.diff(sub.indptr)
+            assert_equal(seen, list(np.flatnonzero(degree)))
+
+class TestCausetAdjMatrix(object):
+    """ Unit tests for causet_adj_matrix function"""
+
+    def test_matches_relation(self):
+        R = np.random.RandomState(1).uniform(size=(40, 2))
+        S = dag.minkowski_pdist(R, output='square')
+        A = dag.causet_adj_matrix(S, R)
+        for i in range(40):
+            for j in range(40):
+                related = R[i, 0] > R[j, 0] and dag.minkowski(R[i], R[j]) < 0
+                assert_equal(A[i, j], float(related))
+
+class TestCompactDtypes(object):
+    """ Unit tests for the dtype options of the matrix routines"""
+
+    def test_compact_matches_float(self):
+        R = np.random.RandomState(2).uniform(size=(30, 2))
+        S = dag.minkowski_pdist(R, output='square')
+        A = dag.causet_adj_matrix(S, R)
+        A_bool = dag.causet_adj_matrix(S, R, dtype=bool)
+        assert_equal(A_bool.dtype, bool)
+        assert_true(np.array_equal(A, A_bool))
+        LP = dag.longest_path_matrix(A.T)
+        LP_8 = dag.longest_path_matrix(A_bool.T, dtype=np.uint8)
+        assert_equal(LP_8.dtype, np.uint8)
+        assert_true(np.array_equal(LP, LP_8))
+        ds2 = dag.naive_spacelike_matrix(LP)
+        ds2_32 = dag.naive_spacelike_matrix(LP_8, dtype=np.float32)
+        assert_equal(ds2_32.dtype, np.float32)
+        assert_true(np.array_equal(ds2, ds2_32))
+
+    def test_dtype_too_small(self):
+        A = np.zeros((300, 300))
+        assert_raises(AssertionError, dag.longest_path_matrix, A,
+                      dtype=np.uint8)
+
+class TestTransitiveClosureReduction(object):
+    """ Unit tests for transitive_completion and transitive_reduction"""
+
+    def test_matches_networkx(self):
+        G = dag.random_dag([[0, 3], [1, 2], [1, 2], [2, 1], [2, 2], [1, 1],
+                            [2, 0], [2, 0]], seed=1)
+        nodes = sorted(G.nodes())
+        A = nx.adjacency_matrix(G, nodes).toarray().astype(float)
+        closed = nx.adjacency_matrix(nx.transitive_closure(G), nodes)
+        reduced = nx.adjacency_matrix(nx.transitive_reduction(G), nodes)
+        C = dag.transitive_completion(A)
+        assert_equal(C.dtype, float)
+        assert_true(np.array_equal(C, closed.toarray()))
+        R = dag.transitive_reduction(A)
+        assert_true(np.array_equal(R, reduced.toarray()))
+        # closing the reduction recovers the closure
+        assert_true(np.array_equal(dag.transitive_completion(R), C))
+
+    def test_outputs(self):
+        G = nx.path_graph(6, create_using=nx.DiGraph())
+        A = nx.adjacency_matrix(G)
+        C = dag.transitive_completion(A)
+        assert_true(sp.issparse(C))
+        assert_equal(C.nnz, 15)
+        C = dag.transitive_completion(A, output='bits')
+        assert_true(isinstance(C, dag.CausalMatrix))
+        R = dag.transitive_reduction(C, output='dense')
+        assert_true(np.array_equal(R, A.toarray()))
+        assert_raises(AssertionError, dag.transitive_completion, A,
+                      output='list')
+
+def loop_spacelike_matrix(LP, dmax=None, k=None):
+    """ Pair by pair naive spacelike distances, to check against"""
+    if dmax is None:
+        dmax = np.max(LP)
+    ds2 = -(LP + LP.T).astype(float) ** 2
+    N = LP.shape[0]
+    for i in range(N):
+        for j in range(min(i, k) if k else i):
+            if ds2[i, j] == 0:
+                w_list = np.flatnonzero(LP[:, i] * LP[:, j])
+                z_list = np.flatnonzero(LP[i] * LP[j])
+                sp_dist = float(dmax)
+                for w in w_list:
+                    for z in z_list:
+                        sp_dist = min(sp_dist, float(LP[w, z]))
+                ds2[i, j] = ds2[j, i] = sp_dist ** 2
+    return ds2
+
+class TestNaiveSpacelikeMatrix(object):
+    """ Unit tests for naive_spacelike_matrix function"""
+
+    def test_matches_loop(self):
+        for N, D, seed in [(40, 2, 0), (60, 2, 1), (50, 3, 2), (30, 4, 3)]:
+            G = dag.cube_space_graph(N, D, seed=seed)
+            LP = dag.longest_path_matrix(nx.adjacency_matrix(G, range(N)))
+            ds2 = dag.naive_spacelike_matrix(LP)
+            assert_true(np.array_equal(ds2, loop_spacelike_matrix(LP)))
+            assert_true(np.array_equal(ds2, ds2.T))
+            for dmax, k in [(3, None), (None, 5), (4, 10), (20, None)]:
+                assert_true(np.array_equal(
+                    dag.naive_spacelike_matrix(LP, dmax=dmax, k=k),
+                    loop_spacelike_matrix(LP, dmax=dmax, k=k)))
+
+    def test_no_common_past(self):
+        # two chains 0 -> 1 and 2 -> 3 are spacelike at the default dmax
+        LP = np.array([[0, 1, 0, 0], [0, 0, 0, 0],
+                       [0, 0, 0, 1], [0, 0, 0, 0]])
+        ds2 = dag.naive_spacelike_matrix(LP)
+        assert_equal(ds2[0, 1], -1.)
+        assert_equal(ds2[0, 2], 1.)
+        assert_equal(ds2[3, 1], 1.)
+
+    def test_dmax_above_longest_path(self):
+        # 0 -> 1, 0 -> 2, 3 -> 2: 1 and 2 have no common future
+        LP = np.zeros((4, 4), dtype=np.uint8)
+        LP[0, 1] = LP[0, 2] = LP[3, 2] = 1
+        ds2 = dag.naive_spacelike_matrix(LP, dmax=10)
+        assert_equal(ds2[1, 2], 100.)
+        assert_equal(ds2[0, 3], 100.)
+        assert_true(np.array_equal(ds2, loop_spacelike_matrix(LP, dmax=10)))
+
+class TestLandmarkRows(object):
+    """ Unit tests for the longest paths and separations of landmarks"""
+
+    def setup(self):
+        self.N = 60
+        G = dag.cube_space_graph(self.N, 2, seed=4)
+        self.A = nx.adjacency_matrix(G, range(self.N))
+        self.LP = dag.longest_path_matrix(self.A)
+
+    def test_longest_paths(self):
+        landmarks = [0, 7, 31, 59]
+        LP_from, LP_to = dag.landmark_longest_paths(self.A, landmarks)
+        assert_true(np.array_equal(LP_from, self.LP[landmarks]))
+        assert_true(np.array_equal(LP_to, self.LP[:, landmarks].T))
+
+    def test_all_landmarks(self):
+        ds2 = dag.approx_landmark_spacelike_rows(self.A, np.arange(self.N),
+                                                 candidates=None)
+        assert_true(np.array_equal(ds2, dag.naive_spacelike_matrix(self.LP)))
+
+    def test_some_landmarks(self):
+        landmarks = [2, 11, 40]
+        dmax = np.max(self.LP)
+        full = dag.naive_spacelike_matrix(self.LP)[landmarks]
+        ds2 = dag.approx_landmark_spacelike_rows(self.A, landmarks,
+                                                 dmax=dmax)
+        # timelike separations are exact, and spacelike ones are found
+        # from fewer common past elements so can only be larger
+        timelike = full < 0
+        assert_true(np.array_equal(ds2[timelike], full[timelike]))
+        assert_true(np.all(ds2 >= full))
+        assert_true(np.all(ds2 <= dmax ** 2))
+
+    def test_candidates(self):
+        # fewer candidate landmarks can only give larger separations
+        landmarks = np.arange(0, self.N, 2)
+        dmax = np.max(self.LP)
+        full = dag.naive_spacelike_matrix(self.LP)[landmarks]
+        every = dag.approx_landmark_spacelike_rows(self.A, landmarks,
+                                                   dmax=dmax, candidates=None)
+        for candidates in [1, 3, 16]:
+            ds2 = dag.approx_landmark_spacelike_rows(
+                self.A, landmarks, dmax=dmax, candidates=candidates)
+            assert_true(np.all(ds2 >= every))
+            assert_true(np.all(ds2 >= full))
+            assert_true(np.array_equal(ds2[full < 0], full[full < 0]))
+
+    def test_agreement(self):
+        # nested landmark sets, all containing the first rows compared
+        order = np.random.RandomState(3).permutation(self.N)
+        dmax = np.max(self.LP)
+        full = dag.naive_spacelike_matrix(self.LP)[order[:5]]
+        spacelike = full > 0
+        previous, agreement = None, []
+        for k in [5, 15, 30, self.N]:
+            ds2 = dag.approx_landmark_spacelike_rows(
+                self.A, np.sort(order[:k]), dmax=dmax, candidates=None)
+            rows = ds2[np.searchsorted(np.sort(order[:k]), order[:5])]
+            assert_true(np.all(rows >= full))
+            # more landmarks can only bring separations closer
+            if previous is not None:
+                assert_true(np.all(rows <= previous))
+            agreement.append(np.mean(rows[spacelike] == full[spacelike]))
+            previous = rows
+        assert_true(agreement[0] < 1.)
+        assert_equal(agreement[-1], 1.)
+        assert_equal(agreement, sorted(agreement))
@@ -22,3 +22,77 @@ class TestMDS(object):
         for i in range(N):    
             assert_almost_equal(X[i, 0], (N-1)/2. - i)
         
+
+class TestMDSDtype(object):
+    """ Unit tests for single precision MDS"""
+
+    def test_float32(self):
+        X = np.random.RandomState(0).uniform(size=(20, 2))
+        ds2 = dag.minkowski_pdist(X, output='square')
+        Y = dag.mds(ds2, 2, method='lorentzian')
+        Y_32 = dag.mds(ds2, 2, method='lorentzian', dtype=np.float32)
+        assert_equal(Y_32.dtype, np.float32)
+        assert_true(np.allclose(np.abs(Y), np.abs(Y_32), atol=1e-4))
+
+
+class TestLandmarkMDS(object):
+    """ Unit tests for landmark MDS"""
+
+    def setup(self):
+        self.X = np.random.RandomState(1).uniform(size=(40, 2))
+
+    def test_all_landmarks(self):
+        ds2 = dag.minkowski_pdist(self.X, output='square')
+        Y = dag.mds(ds2, 2, method='lorentzian')
+        Y_L = dag.landmark_mds(ds2, np.arange(40), 2, method='lorentzian')
+        assert_true(np.allclose(Y, Y_L))
+
+    def test_triangulation(self):
+        # points in 2D Minkowski space are recovered from 6 landmarks
+        ds2 = dag.minkowski_pdist(self.X, output='square')
+        landmarks = [0, 5, 9, 13, 22, 30]
+        Y = dag.landmark_mds(ds2[landmarks], landmarks, 2,
+                             method='lorentzian')
+        assert_equal(Y.shape, (40, 2))
+        assert_true(np.allclose(dag.minkowski_pdist(Y, output='square'),
+                                ds2))
+
+    def test_euclidean(self):
+        diff = self.X[:, np.newaxis] - self.X[np.newaxis, :]
+        ds2 = np.sum(diff ** 2, axis=2)
+        landmarks = [1, 4, 8, 20]
+        Y = dag.landmark_mds(ds2[landmarks], landmarks, 2)
+        diff = Y[:, np.newaxis] - Y[np.newaxis, :]
+        assert_true(np.allclose(np.sum(diff ** 2, axis=2), ds2))
+
+
+class TestMDSSolvers(object):
+    """ Unit tests for the double centering and partial eigensolvers"""
+
+    def setup(self):
+        R = np.random.RandomState(2).uniform(size=(60, 3))
+        self.ds2 = dag.minkowski_pdist(R, output='square')
+        diff = R[:, np.newaxis] - R[np.newaxis, :]
+        self.de2 = np.sum(diff ** 2, axis=2)
+
+    def test_double_centre(self):
+        J = np.identity(60) - 1. / 60
+        expected = -0.5 * np.dot(np.dot(J, self.ds2), J)
+        v = np.random.RandomState(3).uniform(size=60)
+        Av = dag.double_centre_operator(self.ds2).matvec(v)
+        assert_true(np.allclose(Av, np.dot(expected, v)))
+
+    def test_solvers_agree(self):
+        for ds2, method in [(self.de2, 'euclidean'),
+                            (self.ds2, 'lorentzian')]:
+            for D in [1, 2, 3]:
+                X = dag.mds(ds2, D, method=method, solver='dense')
+                assert_true(np.array_equal(
+                    X, dag.mds(ds2, D, method=method)))
+                for solver in ['eigsh', 'operator']:
+                    Y = dag.mds(ds2, D, method=method, solver=solver)
+                    assert_equal(Y.shape, (60, D))
+                    assert_true(np.allclose(np.abs(X), np.abs(Y)))
+
+    def test_bad_solver(self):
+        assert_raises(AssertionError, dag.mds, self.ds2, 2, solver='qr')
@@ -3,6 +3,9 @@ General form - metric(x, y) returns real number distance between points x and y
 
 Note we can use these in
 scipy.spatial.distance.pdist()
+but this calls the metric once per pair, so for many points use the array
+kernels metric_cdist(X, Y) and metric_pdist(X) below, which return the same
+values for whole blocks of pairs at once.
 
 """
 
@@ -15,6 +18,8 @@ __author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
 
 import numpy as np
 
+import dagology as dag
+
 def spherical(x_, y_):
     """Calculate distance on the surface of a d-sphere between points x and y
 
@@ -33,29 +38,55 @@ def spherical(x_, y_):
     return psi
 
 
-def angular_to_cartesian(a):
-    """Convert D angular spherical coordinates to D+1 cartesian - assume radius=1 """
-    D = len(a)
-    x = np.ones(D + 1)
-    i = 0
+def angular_to_cartesian(a, dtype=float):
+    """Convert D angular spherical coordinates to D+1 cartesian - assume radius=1
+
+    a may be a single point or an NxD array of points, giving Nx(D+1)
+    dtype - floating point type of the calculation and result"""
+    a = np.asarray(a, dtype=dtype)
+    if a.ndim == 1:
+        return angular_to_cartesian(a[np.newaxis, :], dtype)[0]
+    N, D = a.shape
+    x = np.ones((N, D + 1), dtype=dtype)
     for i in range(D):
-        x[i] *= np.cos(a[i])
-        x[i + 1:] *= np.sin(a[i])
+        x[:, i] *= np.cos(a[:, i])
+        x[:, i + 1:] *= np.sin(a[:, i, np.newaxis])
     return x
 
 
-def cartesian_to_angular(a):
-    """Convert d cartesian to d-1 angular spherical coordinates - assume radius=1 """
-    D = len(a)
-    x = np.zeros(D - 1)
+def cartesian_to_angular(a, dtype=float):
+    """Convert d cartesian to d-1 angular spherical coordinates - assume radius=1
+
+    a may be a single point or an Nxd array of points, giving Nx(d-1)
+    Angles are 0 where they are undefined, at the poles
+    dtype - floating point type of the calculation and result"""
+    a = np.asarray(a, dtype=dtype)
+    if a.ndim == 1:
+        return cartesian_to_angular(a[np.newaxis, :], dtype)[0]
+    N, D = a.shape
+    x = np.zeros((N, D - 1), dtype=dtype)
+    # norm of each point in coordinates i onwards
+    tail = np.sqrt(np.cumsum((a * a)[:, ::-1], axis=1)[:, ::-1])
     for i in range(D - 1):
-        psi = np.arccos(a[i] / np.sqrt(np.sum((a[i:])**2)))
-        x[i] = psi
-    if a[-1] < 0:
-        x[-1] = (2. * np.pi) - x[-1]
+        defined = tail[:, i] > 0.
+        cos_psi = a[defined, i] / tail[defined, i]
+        x[defined, i] = np.arccos(np.clip(cos_psi, -1., 1.))
+    flip = a[:, -1] < 0
+    x[flip, -1] = (2. * np.pi) - x[flip, -1]
     return x
 
 
+def to_cartesian(X, first=0, dtype=float):
+    """Replace angular coordinates X[:, first:] by Cartesian coordinates
+
+    Kernels taking cartesian=True accept the result, so the trigonometry is
+    done once per point and reused across many distance calculations.
+    For spherical points first=0, and first=1 for de Sitter or hyperbolic
+    points whose first coordinate is time or radius."""
+    X = np.atleast_2d(np.asarray(X, dtype=dtype))
+    return np.hstack((X[:, :first], angular_to_cartesian(X[:, first:], dtype)))
+
+
 def hyperbolic(x, y, a=1.):
     """Calculate hyperbolic distances between coordinates in native representation """
     if np.array_equal(x, y):
@@ -94,9 +125,8 @@ def minkowski_periodic(x, y, period, c=1.):
     assert len(y) == D, 'ERROR - vectors in minkowski have different lengths'
     if np.array_equal(x, y):
         return 0.
-        
-    while len(period) < (D - 1):
-        period.append(None)
+
+    period = spatial_periods(period, D)
     dt = x[0] - y[0]
     dt2 = dt * dt
     ds2 = -1 * dt2
@@ -107,10 +137,53 @@ def minkowski_periodic(x, y, period, c=1.):
                       ** 2, (x[d] - y[d] - period_d)**2)
         else:
             dx2 = (x[d] - y[d])**2
-        ds2 += dx2
+        ds2 += dx2 * c * c
+    return ds2
+
+
+def minkowski_periodic_cdist(X, Y, period, c=1., dtype=float):
+    """Calculate Minkowski separations between all rows of X and all rows of Y
+       with periodic boundary conditions in spatial coordinates
+
+    X - MxD array of coordinates
+    Y - NxD array of coordinates
+    period - list - the periodic size of each spatial dimension, None for
+             dimensions without a boundary, or a number for all of them
+    c - speed of light - default to 1.
+    dtype - floating point type of the calculation and result, see
+            pairwise_kernel
+
+    Returns MxN array of separations using -++...+ convention"""
+    X, Y = _check_cdist_args(X, Y, 'minkowski', dtype)
+    D = X.shape[1]
+    period = spatial_periods(period, D)
+    dt = X[:, 0, np.newaxis] - Y[np.newaxis, :, 0]
+    ds2 = -1 * dt * dt
+    for d in range(1, D):
+        dx = X[:, d, np.newaxis] - Y[np.newaxis, :, d]
+        period_d = period[d - 1]
+        if period_d:
+            # minimum image displacement, exact wherever the points lie
+            dx -= period_d * np.round(dx / period_d)
+        dx *= dx
+        ds2 += dx * c * c
     return ds2
 
 
+def spatial_periods(period, D):
+    """Return list of the D-1 spatial periods, None where there is no boundary
+
+    period may be a list, shorter than D-1, or a single number used for every
+    spatial dimension. The list given is not modified."""
+    if period is None:
+        return [None] * (D - 1)
+    try:
+        period = list(period)
+    except TypeError:
+        return [period] * (D - 1)
+    return period + [None] * (D - 1 - len(period))
+
+
 def de_sitter(x, y):
     """ Calculate de Sitter separation between x and y in conformal coordinates"""
     assert len(x) == len(
@@ -123,5 +196,195 @@ def de_sitter(x, y):
     dx2 = dx * dx
     return (dx2 - dt2)
 
+
+##########################################################################
+# Pairwise kernels
+##########################################################################
+
+def pairwise_kernel(cdist, X, output='condensed', block_size=None, dtype=float,
+                    **kwargs):
+    """Apply an array kernel to all pairs of rows of X, a block at a time
+
+    cdist - function cdist(X, Y, **kwargs) returning the MxN array of
+            separations between rows of X and rows of Y
+    X - NxD array of coordinates
+    output - 'condensed' - 1D array of the separations of pairs i < j, in
+                           the order of scipy.spatial.distance.pdist
+             'square' - NxN array with zero diagonal
+             'blocks' - generator of (start, stop, block), where block is
+                        the array of separations of rows start:stop of X
+                        from all rows of X
+    block_size - number of rows of X in each block, by default chosen so a
+                 block uses about BLOCK_MEMORY bytes
+    dtype - floating point type of the calculation and result, passed on to
+            cdist. np.float32 halves the memory but keeps only about 7
+            significant figures, so separations within about 1e-7 times the
+            squared coordinate range of zero may have the wrong sign
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=dtype))
+    N = X.shape[0]
+    kwargs['dtype'] = dtype
+    if block_size is None:
+        block_size = int(max(1, dag.utils.BLOCK_MEMORY // (32 * max(N, 1))))
+    if output == 'blocks':
+        return _kernel_blocks(cdist, X, block_size, kwargs)
+    elif output == 'square':
+        S = np.zeros((N, N), dtype=dtype)
+        for start, stop, block in _kernel_blocks(cdist, X, block_size, kwargs):
+            S[start:stop] = block
+        S[np.diag_indices(N)] = 0.
+        return S
+    elif output == 'condensed':
+        S = np.zeros(N * (N - 1) // 2, dtype=dtype)
+        k = 0
+        for start in range(0, N, block_size):
+            stop = min(start + block_size, N)
+            # only pairs with the later point at or after start are needed
+            block = cdist(X[start:stop], X[start:], **kwargs)
+            upper = np.triu_indices(stop - start, 1, N - start)
+            S[k:k + len(upper[0])] = block[upper]
+            k += len(upper[0])
+        return S
+    else:
+        assert False, 'ERROR - output must be condensed, square or blocks'
+
+
+def _kernel_blocks(cdist, X, block_size, kwargs):
+    """Yield (start, stop, block) of the separations of blocks of rows of X"""
+    for start in range(0, X.shape[0], block_size):
+        stop = min(start + block_size, X.shape[0])
+        yield start, stop, cdist(X[start:stop], X, **kwargs)
+
+
+def _check_cdist_args(X, Y, name, dtype=float):
+    """Return X and Y as 2D arrays of dtype with the same number of columns"""
+    X = np.atleast_2d(np.asarray(X, dtype=dtype))
+    Y = np.atleast_2d(np.asarray(Y, dtype=dtype))
+    assert X.shape[1] == Y.shape[1], \
+        'ERROR - coordinates in %s have different dimensions' % name
+    return X, Y
+
+
+def minkowski_cdist(X, Y, c=1., dtype=float):
+    """Calculate Minkowski separations between all rows of X and all rows
+    of Y using -++...+ convention, see minkowski
+
+    dtype - floating point type of the calculation and result, see
+            pairwise_kernel
+
+    Returns MxN array of separations"""
+    X, Y = _check_cdist_args(X, Y, 'minkowski', dtype)
+    dt = X[:, 0, np.newaxis] - Y[np.newaxis, :, 0]
+    ds2 = -1 * dt * dt
+    for d in range(1, X.shape[1]):
+        dx = X[:, d, np.newaxis] - Y[np.newaxis, :, d]
+        ds2 += dx * dx * c * c
+    return ds2
+
+
+def minkowski_pdist(X, c=1., output='condensed', block_size=None, dtype=float):
+    """Calculate Minkowski separations between all pairs of rows of X,
+    see pairwise_kernel for the output and dtype options"""
+    return pairwise_kernel(minkowski_cdist, X, output, block_size, dtype, c=c)
+
+
+def minkowski_periodic_pdist(X, period, c=1., output='condensed',
+                             block_size=None, dtype=float):
+    """Calculate periodic Minkowski separations between all pairs of rows of
+    X, see minkowski_periodic_cdist and pairwise_kernel"""
+    return pairwise_kernel(minkowski_periodic_cdist, X, output, block_size,
+                           dtype, period=period, c=c)
+
+
+def spherical_cdist(X, Y, cartesian=False, dtype=float):
+    """Calculate distances on the surface of a d-sphere between all rows of
+    X and all rows of Y in angular coordinates, see spherical
+
+    cartesian - if True X and Y are given in Cartesian coordinates instead,
+                see to_cartesian
+    dtype - floating point type of the calculation and result, see
+            pairwise_kernel
+
+    Returns MxN array of distances"""
+    X, Y = _check_cdist_args(X, Y, 'spherical metric', dtype)
+    if X.shape[1] == 1 and not cartesian:
+        dx = np.abs(X[:, 0, np.newaxis] - Y[np.newaxis, :, 0])
+        return np.minimum(dx, 2. * np.pi - dx)
+    if not cartesian:
+        X, Y = angular_to_cartesian(X, dtype), angular_to_cartesian(Y, dtype)
+    # the angle from the chord length is accurate for nearby points, and
+    # exactly zero for identical ones, unlike the arccos of the dot product
+    chord2 = np.zeros((X.shape[0], Y.shape[0]), dtype=dtype)
+    for d in range(X.shape[1]):
+        dx = X[:, d, np.newaxis] - Y[np.newaxis, :, d]
+        chord2 += dx * dx
+    return 2. * np.arcsin(np.minimum(0.5 * np.sqrt(chord2), 1.))
+
+
+def spherical_pdist(X, cartesian=False, output='condensed', block_size=None,
+                    dtype=float):
+    """Calculate spherical distances between all pairs of rows of X,
+    see pairwise_kernel for the output and dtype options"""
+    if not cartesian:
+        # convert once rather than once per block
+        X, cartesian = to_cartesian(X, 0, dtype), True
+    return pairwise_kernel(spherical_cdist, X, output, block_size, dtype,
+                           cartesian=cartesian)
+
+
+def hyperbolic_cdist(X, Y, a=1., cartesian=False, dtype=float):
+    """Calculate hyperbolic distances between all rows of X and all rows of
+    Y in native representation, see hyperbolic
+
+    cartesian - if True the angular coordinates of X and Y are given in
+                Cartesian coordinates instead, see to_cartesian
+    dtype - floating point type of the calculation and result, see
+            pairwise_kernel
+
+    Returns MxN array of squared distances, as hyperbolic"""
+    X, Y = _check_cdist_args(X, Y, 'hyperbolic metric', dtype)
+    d_theta = spherical_cdist(X[:, 1:], Y[:, 1:], cartesian, dtype)
+    r_x, r_y = a * X[:, 0, np.newaxis], a * Y[np.newaxis, :, 0]
+    cosh_ad = (np.cosh(r_x) * np.cosh(r_y)) - \
+        (np.sinh(r_x) * np.sinh(r_y) * np.cos(d_theta))
+    d = np.arccosh(np.maximum(cosh_ad, 1.)) / a
+    return d * d
+
+
+def hyperbolic_pdist(X, a=1., cartesian=False, output='condensed',
+                     block_size=None, dtype=float):
+    """Calculate hyperbolic distances between all pairs of rows of X,
+    see pairwise_kernel for the output and dtype options"""
+    if not cartesian:
+        X, cartesian = to_cartesian(X, 1, dtype), True
+    return pairwise_kernel(hyperbolic_cdist, X, output, block_size, dtype,
+                           a=a, cartesian=cartesian)
+
+
+def de_sitter_cdist(X, Y, cartesian=False, dtype=float):
+    """Calculate de Sitter separations between all rows of X and all rows of
+    Y in conformal coordinates, see de_sitter
+
+    cartesian - if True the angular coordinates of X and Y are given in
+                Cartesian coordinates instead, see to_cartesian
+    dtype - floating point type of the calculation and result, see
+            pairwise_kernel
+
+    Returns MxN array of separations"""
+    X, Y = _check_cdist_args(X, Y, 'de Sitter metric', dtype)
+    dt = X[:, 0, np.newaxis] - Y[np.newaxis, :, 0]
+    dx = spherical_cdist(X[:, 1:], Y[:, 1:], cartesian, dtype)
+    return (dx * dx) - (dt * dt)
+
+
+def de_sitter_pdist(X, cartesian=False, output='condensed', block_size=None,
+                    dtype=float):
+    """Calculate de Sitter separations between all pairs of rows of X,
+    see pairwise_kernel for the output and dtype options"""
+    if not cartesian:
+        X, cartesian = to_cartesian(X, 1, dtype), True
+    return pairwise_kernel(de_sitter_cdist, X, output, block_size, dtype,
+                           cartesian=cartesian)
+
 if __name__ == "__main__":
     print __doc__
@@ -0,0 +1,157 @@
+""" Reachability index of a DAG, cached on the graph"""
+
+#    Copyright (C) 2016 by
+#    James Clough <james.clough91@gmail.com>
+#    All rights reserved.
+#    BSD license.
+
+__author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
+
+import numpy as np
+
+import dagology as dag
+
+__all__ = ['ReachabilityIndex',
+           'reachability_index',
+           'cached_reachability_index',
+           'invalidate_reachability_index']
+
+# key of the cached index in G.graph
+CACHE_KEY = '_reachability_index'
+
+
+class ReachabilityIndex(object):
+    """ Descendant and ancestor bitsets of every node of a DAG
+
+    The transitive closure is found in one sweep over the topological order
+    and stored as a CausalMatrix, so each query reads a row or column of
+    N/64 words rather than traversing the graph.
+
+    Attributes
+    ----------
+
+    closure - CausalMatrix of the transitive closure, rows in node_list order
+    node_list - list of the nodes of the graph
+    index - dict from node to its row in closure
+    graph_id - id of the graph indexed, so a copy does not reuse the index
+    fingerprint - numbers of nodes and edges of the graph indexed, and
+                  hashes of its sets of nodes and edges
+    """
+
+    def __init__(self, G, node_list=None):
+        if node_list is None:
+            node_list = list(G.nodes())
+        self.node_list = list(node_list)
+        self.index = dict((node, i) for i, node in enumerate(self.node_list))
+        self.closure = dag.CausalMatrix.from_graph(G, self.node_list).closure()
+        self.graph_id = id(G)
+        self.fingerprint = _fingerprint(G)
+        self._transpose = None
+
+    @property
+    def transpose(self):
+        """ CausalMatrix whose rows are ancestors, computed when first used"""
+        if self._transpose is None:
+            self._transpose = self.closure.T
+        return self._transpose
+
+    def is_valid(self, G, full=False):
+        """ Return True if G still has the nodes and edges indexed
+
+        Only the identity of G and its numbers of nodes and edges are
+        compared, unless full is True when its nodes and edges are hashed
+        too, which takes O(N + E) time"""
+        if id(G) != self.graph_id or _counts(G) != self.fingerprint[:2]:
+            return False
+        return not full or _fingerprint(G) == self.fingerprint
+
+    def _nodes(self, indices):
+        return set(self.node_list[i] for i in indices)
+
+    def descendants(self, a):
+        """ Set of descendants of node a, as nx.descendants"""
+        return self._nodes(self.closure.descendants(self.index[a]))
+
+    def ancestors(self, b):
+        """ Set of ancestors of node b, as nx.ancestors"""
+        return self._nodes(self.transpose.descendants(self.index[b]))
+
+    def related(self, a, b):
+        """ Return True if there is a path from node a to node b"""
+        return self.closure.related(self.index[a], self.index[b])
+
+    def interval_nodes(self, a, b):
+        """ Set of nodes in the interval [a, b], including a and b"""
+        i, j = self.index[a], self.index[b]
+        if i == j:
+            return set([a])
+        if not self.closure.related(i, j):
+            return set()
+        inside = dag.unpack_rows(
+            (self.closure.bits[i] & self.transpose.bits[j])[np.newaxis, :],
+            self.closure.N)[0]
+        return self._nodes(np.flatnonzero(inside)).union([a, b])
+
+    def interval_size(self, a, b):
+        """ Number of nodes in the interval [a, b], including a and b"""
+        return self.closure.interval_size(self.index[a], self.index[b],
+                                          self.transpose)
+
+
+def reachability_index(G, node_list=None):
+    """ Return the reachability index of G, building and caching it if needed
+
+    Parameters
+    ----------
+
+    G - NetworkX DiGraph (DAG)
+    node_list - order of the nodes in the index, default to G.nodes()
+
+    Returns
+    -------
+
+    ReachabilityIndex, stored in G.graph so that interval, interval_sizes,
+    count_chains, chain_spectrum, mmd and mpsd use it for G
+
+    Notes
+    -----
+
+    Here the cached index is checked against hashes of the nodes and edges
+    of G, and rebuilt if they have changed, in O(N + E) time. The algorithms
+    using the cache only compare the numbers of nodes and edges, so that
+    each query stays cheap, and do not notice mutations keeping both the
+    same, such as moving an edge - call reachability_index again or
+    invalidate_reachability_index after them. The cache is not used for
+    copies of G.
+    """
+    index = getattr(G, 'graph', {}).get(CACHE_KEY)
+    if (index is None or not index.is_valid(G, full=True) or
+            (node_list is not None and list(node_list) != index.node_list)):
+        index = ReachabilityIndex(G, node_list)
+        G.graph[CACHE_KEY] = index
+    return index
+
+
+def cached_reachability_index(G):
+    """ Return the reachability index cached on G, or None
+
+    The index is returned if G is the graph indexed and has the same
+    numbers of nodes and edges, see reachability_index"""
+    index = getattr(G, 'graph', {}).get(CACHE_KEY)
+    if index is not None and index.is_valid(G):
+        return index
+    return None
+
+
+def invalidate_reachability_index(G):
+    """ Remove any reachability index cached on G"""
+    G.graph.pop(CACHE_KEY, None)
+
+
+def _counts(G):
+    return (G.number_of_nodes(), G.number_of_edges())
+
+
+def _fingerprint(G):
+    return _counts(G) + (hash(frozenset(G.nodes())),
+                         hash(frozenset(G.edges())))
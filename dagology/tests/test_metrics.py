@@ -3,6 +3,7 @@ from nose.tools import assert_false
 from nose.tools import assert_in
 from nose.tools import assert_raises
 from nose.tools import assert_true
+from nose.tools import assert_almost_equal
 
 import networkx as nx
 import numpy as np
@@ -12,3 +13,125 @@ class TestEucludea(object):
     """ Unit tests for interval function"""
 
     pass
+
+class TestMinkowskiPeriodic(object):
+    """ Unit tests for periodic Minkowski separations"""
+
+    def test_period_not_modified(self):
+        period = [1.]
+        dag.minkowski_periodic(np.zeros(4), np.ones(4), period)
+        assert_equal(period, [1.])
+
+    def test_cdist_matches_scalar(self):
+        for period in [[0.7], [0.7, 0.4], 0.5]:
+            # coordinates inside the periodic box
+            X = np.random.random((20, 3)) * 0.4
+            Y = np.random.random((30, 3)) * 0.4
+            ds2 = dag.minkowski_periodic_cdist(X, Y, period)
+            for i in range(20):
+                for j in range(30):
+                    assert_almost_equal(ds2[i, j],
+                        dag.minkowski_periodic(X[i], Y[j], period))
+
+    def test_images(self):
+        x = np.array([[0., 0.1]])
+        y = np.array([[1., 3.05]])
+        # the nearest image is 3 periods away
+        assert_almost_equal(dag.minkowski_periodic_cdist(x, y, [1.])[0, 0],
+                            0.05**2 - 1.)
+
+class TestPairwiseKernels(object):
+    """ Unit tests for the array metric kernels"""
+
+    def check_pdist(self, pdist, metric, X, **kwargs):
+        from scipy.spatial.distance import pdist as scipy_pdist
+        from scipy.spatial.distance import squareform
+        expected = scipy_pdist(X, lambda x, y: metric(x, y, **kwargs))
+        assert_true(np.allclose(pdist(X, **kwargs), expected))
+        assert_true(np.allclose(pdist(X, block_size=3, **kwargs), expected))
+        S = pdist(X, output='square', block_size=4, **kwargs)
+        assert_true(np.allclose(S, squareform(expected)))
+        blocks = list(pdist(X, output='blocks', block_size=5, **kwargs))
+        assert_equal([(start, stop) for start, stop, _ in blocks],
+                     [(0, 5), (5, 10), (10, 12)])
+        assert_true(np.allclose(np.vstack([b for _, _, b in blocks]), S))
+
+    def test_minkowski(self):
+        X = np.random.random((12, 3))
+        self.check_pdist(dag.minkowski_pdist, dag.minkowski, X)
+        self.check_pdist(dag.minkowski_pdist, dag.minkowski, X, c=2.)
+        Y = np.random.random((7, 3))
+        ds2 = dag.minkowski_cdist(X, Y)
+        assert_equal(ds2.shape, (12, 7))
+        assert_almost_equal(ds2[3, 4], dag.minkowski(X[3], Y[4]))
+
+    def test_minkowski_periodic(self):
+        X = np.random.random((12, 3)) * 0.4
+        self.check_pdist(dag.minkowski_periodic_pdist, dag.minkowski_periodic,
+                         X, period=[0.7])
+        self.check_pdist(dag.minkowski_periodic_pdist, dag.minkowski_periodic,
+                         X, period=[0.7], c=2.)
+
+    def test_spherical(self):
+        for D in [1, 2, 3]:
+            X = np.random.random((12, D)) * np.pi
+            X[:, -1] *= 2.
+            self.check_pdist(dag.spherical_pdist, dag.spherical, X)
+
+    def test_de_sitter(self):
+        X = np.random.random((12, 3)) * np.pi
+        self.check_pdist(dag.de_sitter_pdist, dag.de_sitter, X)
+
+    def test_hyperbolic(self):
+        X = np.random.random((12, 2)) * 2. * np.pi
+        self.check_pdist(dag.hyperbolic_pdist, dag.hyperbolic, X, a=0.5)
+
+    def test_invalid_output(self):
+        assert_raises(AssertionError, dag.minkowski_pdist, np.zeros((3, 2)),
+                      output='list')
+
+class TestCoordinateTransforms(object):
+    """ Unit tests for batched angular and Cartesian transforms"""
+
+    def test_batch_matches_points(self):
+        A = np.random.random((10, 3)) * np.pi
+        A[:, -1] *= 2.
+        X = dag.angular_to_cartesian(A)
+        assert_equal(X.shape, (10, 4))
+        for i in range(10):
+            assert_true(np.allclose(X[i], dag.angular_to_cartesian(A[i])))
+            assert_true(np.allclose(dag.cartesian_to_angular(X[i]), A[i]))
+        assert_true(np.allclose(dag.cartesian_to_angular(X), A))
+        assert_true(np.allclose(np.sum(X * X, axis=1), 1.))
+
+    def test_poles(self):
+        assert_true(np.array_equal(dag.cartesian_to_angular([1., 0., 0.]),
+                                   [0., 0.]))
+
+    def test_cartesian_kernels(self):
+        X = np.random.random((8, 3)) * np.pi
+        Y = np.random.random((5, 3)) * np.pi
+        Xc, Yc = dag.to_cartesian(X, 1), dag.to_cartesian(Y, 1)
+        assert_equal(Xc.shape, (8, 4))
+        assert_true(np.allclose(dag.de_sitter_cdist(X, Y),
+                                dag.de_sitter_cdist(Xc, Yc, cartesian=True)))
+        assert_true(np.allclose(dag.de_sitter_pdist(X),
+                                dag.de_sitter_pdist(Xc, cartesian=True)))
+        assert_true(np.allclose(
+            dag.spherical_cdist(X, Y),
+            dag.spherical_cdist(dag.to_cartesian(X), dag.to_cartesian(Y),
+                                cartesian=True)))
+
+class TestKernelDtype(object):
+    """ Unit tests for single precision kernels"""
+
+    def test_float32(self):
+        X = np.random.random((15, 3))
+        for pdist in [dag.minkowski_pdist, dag.de_sitter_pdist,
+                      dag.spherical_pdist, dag.hyperbolic_pdist]:
+            S = pdist(X, output='square')
+            S_32 = pdist(X, output='square', dtype=np.float32)
+            assert_equal(S_32.dtype, np.float32)
+            assert_true(np.allclose(S, S_32, atol=1e-5))
+        ds2 = dag.minkowski_periodic_cdist(X, X, 0.5, dtype=np.float32)
+        assert_equal(ds2.dtype, np.float32)
@@ -0,0 +1,103 @@
+from nose.tools import assert_equal
+from nose.tools import assert_false
+from nose.tools import assert_is
+from nose.tools import assert_is_none
+from nose.tools import assert_is_not
+from nose.tools import assert_true
+
+import networkx as nx
+import numpy as np
+import dagology as dag
+
+
+class TestReachabilityIndex(object):
+    """ Unit tests for the cached reachability index"""
+
+    def setup(self):
+        self.G = dag.cube_space_graph(50, 2, hasse=True, seed=7)
+
+    def test_queries(self):
+        index = dag.ReachabilityIndex(self.G)
+        for a in range(0, 50, 7):
+            assert_equal(index.descendants(a), nx.descendants(self.G, a))
+            assert_equal(index.ancestors(a), nx.ancestors(self.G, a))
+            for b in range(0, 50, 3):
+                assert_equal(index.related(a, b), nx.has_path(self.G, a, b)
+                             and a != b)
+                I = dag.interval(self.G, a, b)
+                assert_equal(index.interval_nodes(a, b), set(I.nodes()))
+                assert_equal(index.interval_size(a, b), I.number_of_nodes())
+
+    def test_labels(self):
+        G = nx.DiGraph()
+        G.add_edges_from([['a', 'b'], ['b', 'c'], ['a', 'd']])
+        index = dag.ReachabilityIndex(G)
+        assert_equal(index.descendants('a'), set(['b', 'c', 'd']))
+        assert_equal(index.interval_nodes('a', 'c'), set(['a', 'b', 'c']))
+        assert_equal(index.interval_nodes('d', 'c'), set())
+
+    def test_cache(self):
+        assert_is_none(dag.cached_reachability_index(self.G))
+        index = dag.reachability_index(self.G)
+        assert_is(dag.reachability_index(self.G), index)
+        assert_is(dag.cached_reachability_index(self.G), index)
+        # mutation changing the number of edges is detected
+        self.G.add_edge(0, 49)
+        assert_is_none(dag.cached_reachability_index(self.G))
+        assert_is_not(dag.reachability_index(self.G), index)
+        dag.invalidate_reachability_index(self.G)
+        assert_is_none(dag.cached_reachability_index(self.G))
+
+    def test_cache_edge_swap(self):
+        G = nx.DiGraph([(0, 1), (1, 2), (3, 4)])
+        index = dag.reachability_index(G)
+        # same numbers of nodes and edges, different relation, which only
+        # reachability_index notices
+        G.remove_edge(3, 4)
+        G.add_edge(2, 3)
+        assert_is(dag.cached_reachability_index(G), index)
+        assert_is_not(dag.reachability_index(G), index)
+        assert_true(dag.cached_reachability_index(G).related(0, 3))
+        # the same edges added in another order still match
+        G.remove_edge(0, 1)
+        G.add_edge(0, 1)
+        assert_is(dag.reachability_index(G), dag.cached_reachability_index(G))
+
+    def test_cache_copy(self):
+        index = dag.reachability_index(self.G)
+        H = self.G.copy()
+        assert_is_none(dag.cached_reachability_index(H))
+        assert_is_not(dag.reachability_index(H), index)
+        assert_is(dag.cached_reachability_index(self.G), index)
+
+    def test_queries_do_not_hash(self):
+        class CountingDiGraph(nx.DiGraph):
+            edge_reads = 0
+
+            @property
+            def edges(self):
+                CountingDiGraph.edge_reads += 1
+                return nx.DiGraph.edges.fget(self)
+
+        G = CountingDiGraph(self.G)
+        dag.reachability_index(G)
+        CountingDiGraph.edge_reads = 0
+        for a in range(0, 50, 5):
+            dag.interval(G, a, 49)
+        dag.interval_sizes(G, [(0, 49), (3, 40)])
+        dag.count_relations(G)
+        # each query only checks the numbers of nodes and edges
+        assert_equal(CountingDiGraph.edge_reads, 0)
+
+    def test_algorithms_use_index(self):
+        G = dag.cube_space_graph(40, 2, seed=8)
+        expected = (dag.count_chains(G, 3), dag.mmd(G), dag.mmd(G, 3),
+                    dag.mpsd(G), list(dag.interval_sizes(G, [(0, 1), (2, 5)])))
+        dag.reachability_index(G)
+        assert_equal((dag.count_chains(G, 3), dag.mmd(G), dag.mmd(G, 3),
+                      dag.mpsd(G),
+                      list(dag.interval_sizes(G, [(0, 1), (2, 5)]))),
+                     expected)
+        index = dag.cached_reachability_index(G)
+        assert_equal(dag.count_chains(index, 2),
+                     index.closure.number_of_relations())
@@ -5,6 +5,7 @@ from nose.tools import assert_raises
 from nose.tools import assert_true
 from nose.tools import assert_almost_equal
 
+import math
 import networkx as nx
 import numpy as np
 import dagology as dag
@@ -42,6 +43,72 @@ class TestCountChains(object):
         assert_equal(dag.count_chains(G, 4), 2)
         assert_equal(dag.count_chains(G, 5), 0)
 
+class TestChainSpectrum(object):
+    """ Unit tests for chain_spectrum function"""
+
+    def test_line(self):
+        G = nx.path_graph(10, create_using=nx.DiGraph())
+        C = dag.chain_spectrum(G, 12)
+        assert_equal(list(C), [comb(10, k, exact=True) for k in range(1, 13)])
+        C_float = dag.chain_spectrum(G, 12, mode='float')
+        assert_true(np.allclose(C_float, C.astype(float)))
+        C_log = dag.chain_spectrum(G, 12, mode='log')
+        assert_true(np.allclose(C_log[:10], np.log(C[:10].astype(float))))
+        assert_true(np.all(np.isneginf(C_log[10:])))
+
+    def test_inputs(self):
+        G = nx.DiGraph()
+        G.add_edges_from([[1,2], [1,3], [2,4], [3,5], [4,6], [5,6]])
+        expected = [6, 11, 8, 2, 0]
+        assert_equal(list(dag.chain_spectrum(G, 5)), expected)
+        A = nx.adjacency_matrix(G)
+        assert_equal(list(dag.chain_spectrum(A, 5)), expected)
+        C = dag.CausalMatrix.from_graph(G).closure()
+        assert_equal(list(dag.chain_spectrum(C, 5, already_tc=True)),
+                     expected)
+
+    def test_exact_beyond_int64(self):
+        # every subset of a total order of 200 elements is a chain
+        G = nx.transitive_closure(nx.path_graph(200, nx.DiGraph()))
+        C = dag.chain_spectrum(G, 100)
+        assert_equal(C[99], comb(200, 100, exact=True))
+        assert_true(C[99] > 2**190)
+        C_log = dag.chain_spectrum(G, 100, mode='log')
+        assert_almost_equal(C_log[99], math.log(C[99]))
+
+    def test_invalid_mode(self):
+        G = nx.path_graph(3, create_using=nx.DiGraph())
+        assert_raises(AssertionError, dag.chain_spectrum, G, 2, 'int')
+
+class TestCountRelations(object):
+    """ Unit tests for count_relations function"""
+
+    def test_matches_closure(self):
+        for N, D, hasse in [(1, 2, False), (60, 2, False), (300, 2, True),
+                            (200, 3, True), (150, 4, False)]:
+            G = dag.cube_space_graph(N, D, hasse=hasse, seed=N)
+            closed = nx.transitive_closure(G)
+            expected = closed.number_of_edges()
+            A = nx.adjacency_matrix(G)
+            assert_equal(dag.count_relations(G), expected)
+            assert_equal(dag.count_relations(A), expected)
+            assert_equal(dag.count_relations(
+                dag.CausalMatrix.from_graph(G)), expected)
+            assert_equal(dag.count_relations(closed, already_tc=True),
+                         expected)
+            assert_equal(dag.count_chains(G, 2), expected)
+
+    def test_line(self):
+        G = nx.path_graph(200, create_using=nx.DiGraph())
+        assert_equal(dag.count_relations(G), 200 * 199 // 2)
+
+    def test_index(self):
+        G = dag.cube_space_graph(40, 2, seed=2)
+        expected = dag.count_relations(G)
+        index = dag.reachability_index(G)
+        assert_equal(dag.count_relations(index), expected)
+        assert_equal(dag.count_relations(G), expected)
+
 class TestInterval(object):
     """ Unit tests for interval function"""
 
@@ -64,6 +131,35 @@ class TestInterval(object):
         I = dag.interval(G, 1, 5)
         assert_equal(sorted(list(I.nodes())), [1, 2, 3, 5])
 
+class TestIntervalSizes(object):
+    """ Unit tests for interval_sizes function"""
+
+    def test_matches_interval(self):
+        G = dag.cube_space_graph(60, 2, seed=3)
+        pairs = [(a, b) for a in range(0, 60, 3) for b in range(0, 60, 4)]
+        sizes = dag.interval_sizes(G, pairs)
+        for (a, b), size in zip(pairs, sizes):
+            if a == b or nx.has_path(G, a, b):
+                assert_equal(size, dag.interval(G, a, b).number_of_nodes())
+            else:
+                assert_equal(size, 0)
+
+    def test_all_pairs(self):
+        G = dag.cube_space_graph(70, 3, hasse=True, seed=5)
+        S = dag.interval_sizes(G)
+        C = nx.transitive_closure(G)
+        assert_equal(S.nnz, C.number_of_edges())
+        for a, b in C.edges():
+            assert_equal(S[a, b], dag.interval(G, a, b).number_of_nodes())
+
+    def test_labels(self):
+        G = nx.DiGraph()
+        G.add_edges_from([['a', 'b'], ['a', 'c'], ['b', 'd'], ['c', 'd']])
+        sizes = dag.interval_sizes(G, [('a', 'd'), ('b', 'c'), ('b', 'b')])
+        assert_equal(list(sizes), [4, 0, 1])
+        C = dag.CausalMatrix.from_graph(G, ['a', 'b', 'c', 'd'])
+        assert_equal(list(dag.interval_sizes(C, [(0, 3), (0, 1)])), [4, 2])
+
 class TestSphereVolume(object):
     """ Unit tests for sphere voume function"""
     
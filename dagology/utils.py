@@ -8,13 +8,25 @@
 __author__ = "\n".join(["James Clough (james.clough91@gmail.com)"])
 
 import math
+import numbers
 import networkx as nx
 import numpy as np
+import scipy.sparse as sp
+
+import dagology as dag
 
 __all__ = ['interval',
+           'interval_sizes',
            'count_chains',
+           'count_relations',
+           'chain_spectrum',
            'sphere_volume',
-           'sphere_volume_analytic_cont']
+           'sphere_volume_analytic_cont',
+           'check_random_state']
+
+# approximate memory in bytes used by temporary arrays in blocked operations,
+# the one setting for the block sizes of every module
+BLOCK_MEMORY = 2**26
 
 
 def interval(G, a, b):
@@ -32,34 +44,323 @@ def interval(G, a, b):
     -------
     
     I - NetworkX DiGraph - the interval [a,b]
+
+    A reachability index cached on G is used instead of traversing G
     """
-    a_dec = nx.descendants(G, a).union([a])
-    b_anc = nx.ancestors(G, b).union([b])
-    I_nodes = a_dec.intersection(b_anc)
+    index = dag.cached_reachability_index(G)
+    if index is not None:
+        I_nodes = index.interval_nodes(a, b)
+    else:
+        a_dec = nx.descendants(G, a).union([a])
+        b_anc = nx.ancestors(G, b).union([b])
+        I_nodes = a_dec.intersection(b_anc)
     I = G.subgraph(I_nodes)
     return I
 
-def count_chains(G, k):
+def interval_sizes(G, pairs=None, already_tc=False, node_list=None):
+    """
+    Calculate the number of nodes in intervals of G without building them
+    
+    Parameters
+    ----------
+    
+    G - NetworkX DiGraph (DAG), CausalMatrix, scipy.sparse adjacency matrix
+        or ReachabilityIndex
+    pairs - sequence of (a, b) pairs of nodes, or None for all related pairs
+            Nodes of matrices are row indices
+    already_tc - bool - True if G is already transitively closed
+    node_list - order of the nodes of a DiGraph in the returned matrix,
+                default to G.nodes()
+    
+    Returns
+    -------
+    
+    If pairs are given, an array of the sizes of I[a,b] for each pair,
+    including a and b, as the number of nodes of interval(G, a, b)
+    Otherwise an NxN scipy.sparse CSR matrix S with S[a,b] the size of
+    I[a,b] for every pair with a preceding b
+
+    Notes
+    -----
+
+    The transitive closure is stored as a CausalMatrix C, so the inside of
+    I[a,b] is the intersection of row a and column b of C. Given pairs are
+    counted with AND and popcount, and all pairs with blocks of the matrix
+    product of C with itself.
+    """
+    C, node_list = _closure(G, already_tc, node_list)
+    if pairs is not None:
+        pairs = list(pairs)
+        if node_list is not None:
+            index = dict((node, i) for i, node in enumerate(node_list))
+            pairs = [(index[a], index[b]) for a, b in pairs]
+        pairs = np.array(pairs, dtype=int).reshape(-1, 2)
+        sizes = np.zeros(len(pairs), dtype=int)
+        CT = C.T
+        chunk = int(max(1, BLOCK_MEMORY // (16 * max(1, C.bits.shape[1]))))
+        for start in range(0, len(pairs), chunk):
+            a, b = pairs[start:start + chunk].T
+            related = (C.bits.view(np.uint8)[a, b // 8] & (128 >> (b % 8))) > 0
+            inside = dag.popcount(C.bits[a] & CT.bits[b], axis=-1)
+            sizes[start:start + chunk] = np.where(related, inside + 2, 0)
+        sizes[pairs[:, 0] == pairs[:, 1]] = 1
+        return sizes
+
+    N = C.N
+    if N == 0:
+        return sp.csr_matrix((0, 0), dtype=int)
+    # in topological order, intervals starting at position s only contain
+    # nodes at later positions, so blocks of the product shrink
+    order = dag.topological_order(C)
+    # float32 sums of counts below 2**24 are exact
+    dtype = np.float32 if N < 2**24 else float
+    block = int(max(1, BLOCK_MEMORY // (16 * N)))
+    rows, cols, data = [], [], []
+    for s in range(0, N, block):
+        later = order[s:]
+        related = dag.unpack_rows(C.bits[order[s:s + block]], N)[:, later]
+        # inside[i, j] counts the nodes after order[s + i] and before later[j]
+        inside = np.zeros(related.shape, dtype=dtype)
+        for t in range(0, len(later), block):
+            below = dag.unpack_rows(C.bits[later[t:t + block]], N)
+            inside[:, t:] += np.dot(related[:, t:t + block].astype(dtype),
+                                    below[:, later[t:]].astype(dtype))
+        i, j = np.nonzero(related)
+        rows.append(order[s + i])
+        cols.append(later[j])
+        data.append(inside[i, j].astype(int) + 2)
+    rows, cols, data = (np.concatenate(x) for x in (rows, cols, data))
+    return sp.csr_matrix((data, (rows, cols)), shape=(N, N))
+
+def _closure(G, already_tc=False, node_list=None):
+    """
+    Return the transitive closure of G as a CausalMatrix, and the node list
+    of its rows, or None if G is already a matrix
+
+    The closure of a ReachabilityIndex, or of one cached on G, is reused
+    """
+    if isinstance(G, dag.ReachabilityIndex):
+        return G.closure, G.node_list
+    index = dag.cached_reachability_index(G)
+    if index is not None and (node_list is None or
+                              list(node_list) == index.node_list):
+        return index.closure, index.node_list
+    if isinstance(G, dag.CausalMatrix):
+        C, node_list = G, None
+    elif hasattr(G, 'tocsr'):
+        C, node_list = dag.CausalMatrix.from_sparse(G), None
+    else:
+        if node_list is None:
+            node_list = list(G.nodes())
+        C = dag.CausalMatrix.from_graph(G, node_list)
+    if not already_tc:
+        C = C.closure()
+    return C, node_list
+
+def count_chains(G, k, already_tc=False):
     """
     Count the number of k-chains in G
     
     Parameters
     ----------
     
-    G - NetworkX DiGraph (DAG)
+    G - NetworkX DiGraph (DAG), CausalMatrix, scipy.sparse adjacency matrix
+        or ReachabilityIndex
     k - int - length of chains to count
+    already_tc - bool - True if G is already transitively closed
     
     Returns
     -------
     
-    C_k - number of chains of length k in G
+    C_k - int - number of chains of length k in G, exact, see chain_spectrum
+    """
+    if k == 2:
+        return count_relations(G, already_tc)
+    return chain_spectrum(G, k, 'exact', already_tc)[k - 1]
+
+def count_relations(G, already_tc=False, node_list=None):
+    """
+    Count the related pairs of G, the edges of its transitive closure
+
+    Parameters
+    ----------
+
+    G - NetworkX DiGraph (DAG), CausalMatrix, scipy.sparse adjacency matrix
+        or ReachabilityIndex. Any edges generating the order will do, such
+        as only the links
+    already_tc - bool - True if G is already transitively closed, so that
+                 its edges are counted
+    node_list - order of the nodes of a graph, default to G.nodes()
+
+    Returns
+    -------
+
+    R - int - number of pairs (a, b) with a path from a to b
+
+    Notes
+    -----
+
+    A reachability index, or one cached on G, is counted directly.
+    Otherwise descendant bitsets are built a topological level at a time
+    from the latest, each the union of those of its children, and counted.
+    A bitset is freed once all the parents of its node have used it, so
+    only the rows of the current frontier are held rather than the whole
+    closure, and no closure graph is built.
+    """
+    if isinstance(G, dag.ReachabilityIndex):
+        return G.closure.number_of_relations()
+    index = dag.cached_reachability_index(G)
+    if index is not None:
+        return index.closure.number_of_relations()
+    if isinstance(G, dag.CausalMatrix):
+        if already_tc:
+            return G.number_of_relations()
+        A = G.to_sparse()
+    elif hasattr(G, 'tocsr'):
+        A = sp.csr_matrix(G, copy=True)
+        A.eliminate_zeros()
+        if already_tc:
+            return A.nnz
+    else:
+        if already_tc:
+            return G.number_of_edges()
+        if node_list is None:
+            node_list = list(G.nodes())
+        A = nx.adjacency_matrix(G, node_list)
+        A.eliminate_zeros()
+    return _streaming_relation_count(A)
+
+def _streaming_relation_count(A):
+    """ Number of relations of the order generated by CSR adjacency A,
+    holding a descendant bitset only while a parent still needs it"""
+    N = A.shape[0]
+    n_words = (N + 63) // 64
+    parents_left = np.bincount(A.indices, minlength=N)
+    # row of the pool holding each element and itself, -1 when freed
+    slot = np.zeros(N, dtype=int) - 1
+    pool = np.zeros((0, n_words), dtype=np.uint64)
+    free = np.zeros(0, dtype=int)
+    # rows of a level counted at once, and of children gathered at once
+    chunk = max(1, BLOCK_MEMORY // (8 * max(n_words, 1)))
+    total = 0
+    for level in reversed(dag.topological_levels(A)):
+        for start in range(0, len(level), chunk):
+            nodes = level[start:start + chunk]
+            sub = A[nodes]
+            rows = np.zeros((len(nodes), n_words), dtype=np.uint64)
+            for group, children, offsets in dag.child_groups(sub, chunk):
+                rows[group] = np.bitwise_or.reduceat(pool[slot[children]],
+                                                     offsets, axis=0)
+            total += dag.popcount(rows)
+            # keep rows, with their own bit, while parents need them
+            keep = np.flatnonzero(parents_left[nodes])
+            if len(keep):
+                if len(free) < len(keep):
+                    grown = max(len(keep) - len(free), len(pool))
+                    free = np.concatenate(
+                        (free, np.arange(len(pool), len(pool) + grown)))
+                    pool = np.concatenate(
+                        (pool, np.zeros((grown, n_words), dtype=np.uint64)))
+                slots, free = free[-len(keep):], free[:-len(keep)]
+                kept = nodes[keep]
+                kept_rows = rows[keep]
+                own = kept_rows.view(np.uint8)
+                own[np.arange(len(keep)), kept // 8] |= \
+                    (128 >> (kept % 8)).astype(np.uint8)
+                pool[slots] = kept_rows
+                slot[kept] = slots
+            # children whose parents have all been counted are freed
+            children = sub.indices
+            parents_left -= np.bincount(children, minlength=N)
+            done = np.unique(children[parents_left[children] == 0])
+            done = done[slot[done] >= 0]
+            free = np.concatenate((free, slot[done]))
+            slot[done] = -1
+    return total
+
+def chain_spectrum(G, k, mode='exact', already_tc=False):
+    """
+    Count the chains of every length up to k in G
+
+    Parameters
+    ----------
+
+    G - NetworkX DiGraph (DAG), CausalMatrix, scipy.sparse adjacency matrix
+        or ReachabilityIndex
+    k - int - length of the longest chains to count
+    mode - 'exact' - Python ints, exact however large the counts
+           'float' - float64, with relative error around 1e-16 per length,
+                     which overflows to inf beyond 1e308
+           'log' - float64 natural logarithms of the counts, -inf for no
+                   chains, which never overflow
+    already_tc - bool - True if G is already transitively closed
+
+    Returns
+    -------
+
+    C - array of length k, C[j-1] is the number of chains of length j, so
+        C[0] is the number of nodes and C[1] the number of relations.
+        The dtype is object for exact mode.
+
+    Notes
+    -----
+
+    The number of j-chains starting at x is the sum over the descendants of
+    x of the number of (j-1)-chains starting there. So with the transitive
+    closure stored as a CausalMatrix each length is one matrix-vector
+    product. Exact counts are split into limbs small enough that the
+    products sum them exactly in float64.
     """
-    sorted_nodes = nx.topological_sort(G)
-    anc = {x:len(nx.descendants(G, x)) for x in sorted_nodes}
-    for j in range(2, k):
-        old_anc = anc
-        anc = {x:int(np.sum([old_anc[y] for y in nx.descendants(G, x)])) for x in anc}        
-    return np.sum(anc.values())
+    assert k >= 1, 'Chains must have at least one element'
+    C, _ = _closure(G, already_tc)
+    N = C.N
+
+    if mode == 'exact':
+        spectrum = np.zeros(k, dtype=object)
+        limb_bits = 53 - N.bit_length()
+        mask = (1 << limb_bits) - 1
+        counts = np.ones(N, dtype=np.int64).astype(object)
+        for j in range(k):
+            spectrum[j] = int(np.sum(counts))
+            if j == k - 1 or spectrum[j] == 0:
+                break
+            remaining, shift = counts, 0
+            counts = np.zeros(N, dtype=np.int64).astype(object)
+            while np.any(remaining):
+                limb = (remaining & mask).astype(float)
+                product = C.dot(limb).astype(np.int64).astype(object)
+                counts = counts + (product << shift)
+                remaining = remaining >> limb_bits
+                shift += limb_bits
+        return spectrum
+    elif mode == 'float':
+        spectrum = np.zeros(k)
+        counts = np.ones(N)
+        for j in range(k):
+            spectrum[j] = np.sum(counts)
+            if j == k - 1 or spectrum[j] == 0:
+                break
+            counts = C.dot(counts)
+        return spectrum
+    elif mode == 'log':
+        # counts are log_scale times a vector with largest entry 1
+        spectrum = np.zeros(k) - np.inf
+        counts, log_scale = np.ones(N), 0.
+        for j in range(k):
+            if N == 0:
+                break
+            spectrum[j] = log_scale + np.log(np.sum(counts))
+            if j == k - 1:
+                break
+            counts = C.dot(counts)
+            scale = np.max(counts)
+            if scale == 0:
+                break
+            counts /= scale
+            log_scale += np.log(scale)
+        return spectrum
+    else:
+        assert False, 'mode must be exact, float or log'
 
 def sphere_volume(d, r=1.):
     """
@@ -102,3 +403,33 @@ def sphere_volume_analytic_cont(d, r=1.):
     
     
 
+def check_random_state(seed=None):
+    """
+    Return a numpy random number generator for the given seed
+
+    Parameters
+    ----------
+
+    seed - None, int, numpy.random.RandomState, or (where numpy provides
+           them) numpy.random.Generator or numpy.random.SeedSequence
+           None gives the global numpy random state, so results follow
+           np.random.seed as before
+
+    Returns
+    -------
+
+    rng - object with numpy's uniform and standard_normal methods
+    """
+    if seed is None or seed is np.random:
+        return np.random.mtrand._rand
+    if isinstance(seed, numbers.Integral):
+        return np.random.RandomState(seed)
+    if isinstance(seed, np.random.RandomState):
+        return seed
+    if hasattr(np.random, 'Generator'):
+        if isinstance(seed, np.random.Generator):
+            return seed
+        if isinstance(seed, np.random.SeedSequence):
+            return np.random.default_rng(seed)
+    raise ValueError('%r cannot be used to seed a random number generator'
+                     % (seed,))